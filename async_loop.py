@@ -0,0 +1,31 @@
+import asyncio
+import threading
+
+
+class AsyncLoop(object):
+    """
+    The single asyncio loop of the coroutine plugins, running in a daemon thread beside the Qt event loop.
+    Results get back to the view through the dispatcher's callbacks, like the ones of the worker pool.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if not self.loop:
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self.loop.run_forever, name="async_loop", daemon=True)
+                self.thread.start()
+        return self.loop
+
+    def submit(self, coroutine):
+        # -> concurrent.futures.Future of the coroutine, cancelling it cancels the coroutine
+        return asyncio.run_coroutine_threadsafe(coroutine, self.start())
+
+    def stop(self):
+        with self.lock:
+            if self.loop:
+                self.loop.call_soon_threadsafe(self.loop.stop)
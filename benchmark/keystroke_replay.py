@@ -0,0 +1,249 @@
+"""
+Replay typing sessions through the query engine and report the latency a user feels:
+the time from a keystroke to the first result row, and to the final result list of its query.
+
+    python benchmark/keystroke_replay.py --keywords "" find dict --output bench.json --compare last.json
+
+Synthetic sessions type phrases of the typing plugin's corpus key by key at realistic intervals.
+Recorded sessions are a json list of {"keys": [[offset_ms, text], ...]}.
+Network bound plugins are pointed at the local stub server, so runs are reproducible offline.
+"""
+import argparse
+import inspect
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path[:0] = [ROOT, os.path.join(ROOT, "plugin")]
+from engine import QueryEngine, stub_api
+from plugin_loader import LazyPlugin
+from stub_server import StubServer, redirect_plugins
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    samples = sorted(samples)
+
+    def rank(p):
+        return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000, 2)
+
+    return {"count": len(samples), "p50": rank(50), "p95": rank(95), "p99": rank(99),
+            "max": round(samples[-1] * 1000, 2)}
+
+
+class LatencyRecorder(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key_time = None
+        self.queries = {}
+        self.last_query = None
+        self.plugin_times = defaultdict(list)
+
+    def keystroke(self):
+        self.key_time = time.perf_counter()
+
+    def begin(self, text):
+        # the query is debounced, it answers the latest keystroke
+        with self.lock:
+            self.last_query = {"text": text, "key": self.key_time, "first_row": None, "last": None,
+                               "settled": False, "token": None}
+
+    def settle(self, text):
+        # the query of the last keystroke of a session, its last delivery is the final list the user reads
+        with self.lock:
+            if self.last_query and self.last_query["text"] == text:
+                self.last_query["settled"] = True
+
+    def deliver(self, token, results):
+        now = time.perf_counter()
+        with self.lock:
+            query = self.queries.get(str(token))
+            if query is None:
+                # the token is created inside the query, its first paint binds it to the latest record
+                if not self.last_query or self.last_query["token"]:
+                    return
+                query = self.queries[str(token)] = self.last_query
+                query["token"] = str(token)
+            if results and query["first_row"] is None:
+                query["first_row"] = now - query["key"]
+            query["last"] = now - query["key"]
+
+    def instrument(self, engine):
+        query = engine.query
+
+        def recorded_query(text, instant=False):
+            self.begin(text)
+            return query(text, instant)
+
+        engine.query = recorded_query
+        for plugin in engine.plugins:
+            self.instrument_plugin(plugin)
+
+    def instrument_plugin(self, plugin):
+        if isinstance(plugin, LazyPlugin):
+            # the loaded plugin is timed, the query of the wrapper would only create the coroutine of a coroutine plugin
+            load_plugin = plugin.load_plugin
+
+            def instrumented_load(manifest):
+                loaded = load_plugin(manifest)
+                if loaded:
+                    self.instrument_plugin(loaded)
+                return loaded
+
+            plugin.load_plugin = instrumented_load
+            if plugin.plugin:
+                self.instrument_plugin(plugin.plugin)
+            return
+        query = plugin.query
+
+        def timed_query(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return query(*args, **kwargs)
+            finally:
+                self.plugin_times[plugin.meta_info.name].append(time.perf_counter() - start)
+
+        async def timed_coroutine(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await query(*args, **kwargs)
+            finally:
+                self.plugin_times[plugin.meta_info.name].append(time.perf_counter() - start)
+
+        async def timed_generator(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                async for item in query(*args, **kwargs):
+                    yield item
+            finally:
+                self.plugin_times[plugin.meta_info.name].append(time.perf_counter() - start)
+
+        if inspect.isasyncgenfunction(query):
+            plugin.query = timed_generator
+        else:
+            plugin.query = timed_coroutine if inspect.iscoroutinefunction(query) else timed_query
+
+    def report(self):
+        queries = [query for query in self.queries.values() if query["text"]]
+        return {"end_to_end": {"first_row": percentiles([q["first_row"] for q in queries if q["first_row"]]),
+                               "final": percentiles([q["last"] for q in queries if q["settled"] and q["last"]])},
+                "plugins": {name: percentiles(times) for name, times in sorted(self.plugin_times.items())}}
+
+
+def corpus_words():
+    corpus_dir = os.path.join("plugins", "typing", "corpus")
+    words = []
+    for doc in sorted(os.listdir(corpus_dir)):
+        with open(os.path.join(corpus_dir, doc), encoding="utf-8") as doc_text:
+            words += re.findall(r"[A-Za-z]{3,}|[一-龥]{2,4}", doc_text.read())
+    return words
+
+
+def synthetic_sessions(count, keywords, interval, seed):
+    rand = random.Random(seed)
+    words = corpus_words()
+    sessions = []
+    for i in range(count):
+        start = rand.randrange(len(words) - 2)
+        phrase = " ".join(words[start:start + rand.choice((1, 1, 2))]).lower()
+        keyword = keywords[i % len(keywords)]
+        text = "{} {}".format(keyword, phrase) if keyword else phrase
+        keys, offset = [], 0
+        for end in range(len(keyword) + 2 if keyword else 1, len(text) + 1):
+            offset += max(30, rand.gauss(interval, interval / 3))
+            keys.append([round(offset), text[:end]])
+        sessions.append({"keys": keys})
+    return sessions
+
+
+def replay(engine, recorder, sessions, settle):
+    for session in sessions:
+        start = time.perf_counter()
+        for offset, text in session["keys"]:
+            delay = start + offset / 1000 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            recorder.keystroke()
+            engine.trigger(text)
+        time.sleep(settle)
+        recorder.settle(session["keys"][-1][1])
+        recorder.keystroke()
+        engine.trigger("")
+        time.sleep(0.1)
+
+
+def compare(old, new):
+    rows = [("end_to_end " + name, old["end_to_end"].get(name, {}), new["end_to_end"][name])
+            for name in new["end_to_end"]]
+    rows += [(name, old["plugins"].get(name, {}), stats) for name, stats in new["plugins"].items()]
+    for name, before, after in rows:
+        cells = []
+        for p in ("p50", "p95", "p99"):
+            if p in before and p in after:
+                change = (after[p] - before[p]) / before[p] * 100 if before[p] else 0
+                cells.append("{} {:.1f}->{:.1f}ms ({:+.0f}%)".format(p, before[p], after[p], change))
+        print("{:<30} {}".format(name, "  ".join(cells) or "no baseline"))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except BaseException:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keystroke replay latency benchmark")
+    parser.add_argument("--sessions", help="json file of recorded typing sessions")
+    parser.add_argument("--count", type=int, default=20, help="number of synthetic sessions")
+    parser.add_argument("--keywords", nargs="*", default=[""], help="keywords typed before the phrases")
+    parser.add_argument("--interval", type=float, default=150, help="mean interval between keys (ms)")
+    parser.add_argument("--latency", type=float, default=80, help="latency of the stub web services (ms)")
+    parser.add_argument("--settle", type=float, default=1.0, help="seconds to wait after a session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as json")
+    parser.add_argument("--compare", help="json report of an earlier run")
+    args = parser.parse_args()
+
+    setting = json.load(open("setting.json", encoding="utf-8"))
+    recorder = LatencyRecorder()
+    engine = QueryEngine(setting.get, lambda results: recorder.deliver(engine.token, results), recorder.deliver)
+    engine.discover_plugins()
+    engine.load_plugins(stub_api(engine, setting.get("language")))
+    server = StubServer(args.latency / 1000).start()
+    redirect_plugins(engine, server.url)
+    recorder.instrument(engine)
+
+    if args.sessions:
+        sessions = json.load(open(args.sessions, encoding="utf-8"))
+    else:
+        sessions = synthetic_sessions(args.count, args.keywords, args.interval, args.seed)
+    loop = threading.Thread(target=engine.run, daemon=True)
+    loop.start()
+    replay(engine, recorder, sessions, args.settle)
+    engine.stop()
+    server.shutdown()
+
+    report = recorder.report()
+    report.update({"commit": git_commit(), "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "sessions": len(sessions), "keystrokes": sum(len(s["keys"]) for s in sessions),
+                   "plugins_loaded": [plugin.meta_info.name for plugin in engine.plugins]})
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+    if args.compare:
+        compare(json.load(open(args.compare, encoding="utf-8")), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Paint result rows with the WidgetDelegate on an offscreen QImage and report the rows painted per second.
+
+    python benchmark/paint_rows.py --rows 50 --rounds 40 --output paint.json --compare before.json
+
+--root paints with the modules of another checkout, e.g. a git worktree of an earlier commit,
+which gives the numbers before a change.
+"""
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit(root):
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except BaseException:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Result row paint benchmark")
+    parser.add_argument("--rows", type=int, default=50, help="rows of the result list")
+    parser.add_argument("--rounds", type=int, default=40, help="times every row is painted")
+    parser.add_argument("--rgba", action="store_true", help="use a rgba(...) highlight color like some themes")
+    parser.add_argument("--row-cache", action="store_true", help="paint through the row pixmap cache")
+    parser.add_argument("--root", help="Beefalo folder whose modules are painted, default this one")
+    parser.add_argument("--output", help="write the report as json")
+    parser.add_argument("--compare", help="json report of an earlier run")
+    args = parser.parse_args()
+
+    output, compare = [os.path.abspath(path) if path else None for path in (args.output, args.compare)]
+    root = os.path.abspath(args.root or ROOT)
+    os.chdir(root)
+    sys.path[:0] = [root, os.path.join(root, "plugin")]
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QRect
+    from PyQt5.QtGui import QImage, QPainter
+    from PyQt5.QtWidgets import QApplication, QStyleOptionViewItem
+    from gui_size import ItemSize, SizeScale
+    from plugin_api import PluginInfo
+    from result_model import ResultItem, MenuItem, CopyAction
+    from result_list import ResultListModel, WidgetDelegate, DEFAULT_COLOR
+
+    app = QApplication([])
+    theme = copy.deepcopy(DEFAULT_COLOR)
+    if args.rgba:
+        theme["result"]["highlight"]["background"] = "rgba(65, 67, 57, 90%)"
+    i_size = ItemSize(SizeScale((1920, 1080)))
+    # whole pixels, recent PyQt5 builds don't take the float sizes of ItemSize as int arguments
+    for name, value in vars(i_size).items():
+        setattr(i_size, name, tuple(round(v) for v in value) if isinstance(value, tuple) else round(value))
+    plugin_info = PluginInfo("benchmark", icon="images/everything_search.png")
+    plugin_info.path = os.path.join("plugins", "everything")
+    items = []
+    for i in range(args.rows):
+        item = ResultItem(plugin_info, "report{}.xlsx".format(i), "C:\\Users\\beefalo\\Documents\\report{}.xlsx".format(i),
+                          "images/everything_search.png" if i % 2 else "images/everything_file.png")
+        item.menus = [MenuItem("\uf0c5 copy", CopyAction(item.subTitle))]
+        items.append(item)
+    model = ResultListModel(None)
+    model.changeItems(items, False)
+    delegate = WidgetDelegate(model, i_size, theme, row_cache=True) if args.row_cache else \
+        WidgetDelegate(model, i_size, theme)
+    if hasattr(delegate, "compile"):
+        delegate.compile()
+
+    row_height = int(i_size.height)
+    image = QImage(int(i_size.width * 8), row_height * args.rows, QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(image)
+    option = QStyleOptionViewItem()
+
+    def paint_all():
+        for row in range(args.rows):
+            option.rect = QRect(0, row * row_height, image.width(), row_height)
+            delegate.paint(painter, option, model.index(row))
+
+    paint_all()  # icons decoded, fonts resolved
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        paint_all()
+    elapsed = time.perf_counter() - start
+    painter.end()
+
+    report = {"rows_per_second": round(args.rows * args.rounds / elapsed), "rows": args.rows, "rounds": args.rounds,
+              "rgba": args.rgba, "row_cache": args.row_cache, "commit": git_commit(root), "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if compare:
+        before = json.load(open(compare, encoding="utf-8"))["rows_per_second"]
+        print("rows/s {} -> {} ({:+.0f}%)".format(before, report["rows_per_second"],
+                                                  (report["rows_per_second"] - before) / before * 100))
+    del app
+
+
+if __name__ == '__main__':
+    main()
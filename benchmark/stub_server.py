@@ -0,0 +1,145 @@
+"""
+Local stand-ins of the web services used by plugins, so that benchmark runs are reproducible offline.
+Every response is canned and delayed by a fixed latency.
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def suggestions(query):
+    return ["{} {}".format(query, suffix) for suffix in ("tutorial", "example", "github", "meaning", "download")]
+
+
+def baidu(params):
+    query = params.get("wd", [""])[0]
+    return "window.baidu.sug({})".format(json.dumps({"q": query, "s": suggestions(query)})), "text/javascript"
+
+
+def google(params):
+    query = params.get("q", [""])[0]
+    items = "".join('<CompleteSuggestion><suggestion data="{}"/></CompleteSuggestion>'.format(text)
+                    for text in suggestions(query))
+    return "<toplevel>{}</toplevel>".format(items), "text/xml"
+
+
+def bilibili(params):
+    query = params.get("term", [""])[0]
+    return json.dumps({str(i): {"value": text} for i, text in enumerate(suggestions(query))}), "application/json"
+
+
+def zhihu(params):
+    query = params.get("q", [""])[0]
+    return json.dumps({"suggest": [{"query": text} for text in suggestions(query)]}), "application/json"
+
+
+def wiki(params):
+    query = params.get("search", [""])[0]
+    return json.dumps([query, suggestions(query)]), "application/json"
+
+
+def youdao(params):
+    query = params.get("q", [""])[0]
+    return json.dumps({"basic": {"us-phonetic": query, "uk-phonetic": query,
+                                 "explains": ["n. {}".format(query), "v. {}".format(query)]},
+                       "speakUrl": ""}), "application/json"
+
+
+def repositories(count):
+    return [{"full_name": "beefalo/repo{}".format(i), "private": False, "stargazers_count": i,
+             "language": "Python", "description": "benchmark repository"} for i in range(count)]
+
+
+def github(path, params):
+    if path.endswith("/search/repositories"):
+        return json.dumps({"items": repositories(30)}), "application/json"
+    if path.endswith("/user/repos"):
+        return json.dumps(repositories(30)), "application/json"
+    return json.dumps([]), "application/json"
+
+
+def trending(params):
+    rows = "".join('<article class="Box-row"><h1 class="lh-condensed">beefalo / trend{}</h1></article>'.format(i)
+                   for i in range(25))
+    return "<html><body>{}</body></html>".format(rows), "text/html"
+
+
+ROUTES = {"/baidu": baidu, "/google": google, "/bilibili": bilibili, "/zhihu": zhihu, "/wiki": wiki,
+          "/youdao": youdao, "/trending": trending}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency=0.05, port=0):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.latency = latency
+        self.requests = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests += 1
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        time.sleep(self.server.latency)
+        if url.path.startswith("/github"):
+            body, content_type = github(url.path, params)
+        elif url.path in ROUTES:
+            body, content_type = ROUTES[url.path](params)
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def redirect_plugins(engine, server_url):
+    # point the network bound plugins of a loaded engine at the stub server, without proxies.
+    # lazy plugins are loaded first, so their modules can be patched
+    plugins = [plugin for plugin in map(engine.resolve_plugin, engine.plugins) if plugin]
+    web_search = sys.modules.get("web_search")
+    if web_search:
+        for name, route in (("BaiduSuggestion", "/baidu"), ("GoogleSuggestion", "/google?output=toolbar&hl=en"),
+                            ("BilibiliSuggestion", "/bilibili"), ("ZhihuSuggestion", "/zhihu"),
+                            ("WikiSuggestion", "/wiki?action=opensearch&format=json")):
+            getattr(web_search, name).url = server_url + route
+    translate = sys.modules.get("translate")
+    if translate:
+        translate.api_url = server_url + "/youdao"
+    github = sys.modules.get("github")
+    if github:
+        github.api_root = server_url + "/github"
+        github.web_root = server_url
+        github.proxy = None
+    for plugin in plugins:
+        for suggestion in getattr(plugin, "suggestions", {}).values():
+            if hasattr(suggestion, "proxy"):
+                suggestion.proxy = None
+        if hasattr(plugin, "proxy"):
+            plugin.proxy = None
+
+
+if __name__ == '__main__':
+    server = StubServer(float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.05, 8765)
+    print("stub server on", server.url)
+    server.serve_forever()
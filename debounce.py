@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class DebounceScheduler(object):
+    """
+    Fire once per quiet period: every trigger pushes the deadline back, wait() returns the latest payload
+    when the deadline passed. Instant triggers fire without delay.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.deadline = None
+        self.payload = None
+        self.closed = False
+
+    def trigger(self, payload, instant=False):
+        with self.condition:
+            self.payload = payload
+            self.deadline = time.monotonic() + (0 if instant else self.interval)
+            self.condition.notify()
+
+    def cancel(self):
+        with self.condition:
+            self.deadline = None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def wait(self):
+        # block until the quiet period is over, None means the scheduler has been closed
+        with self.condition:
+            while not self.closed:
+                if self.deadline is None:
+                    self.condition.wait()
+                    continue
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    self.deadline = None
+                    return self.payload
+                self.condition.wait(remaining)
+            return None
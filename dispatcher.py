@@ -0,0 +1,337 @@
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, CancelledError
+
+from async_loop import AsyncLoop
+from global_scheduler import GlobalScheduler, DEFER, SKIP
+from perf_stats import PerfStats
+from plugin_api import SettingInterface, get_logger
+from plugin_loader import LazyPlugin
+from result_cache import ResultCache
+from result_model import ResultSource, NO_CACHE
+
+log = get_logger("Dispatcher")
+# seconds between two batches of results streamed by a generator
+FRAME = 0.016
+
+
+class QueryTask(object):
+    def __init__(self, plugin, keyword, text):
+        self.plugin = plugin
+        self.keyword = keyword
+        self.text = text
+        self.items = None
+        self.async_thread = None
+        self.future = None
+        self.start = None
+        # the items were delivered while the plugin yielded them
+        self.streamed = False
+        # the query raised, was cancelled or returned NO_CACHE, its items aren't cached
+        self.failed = False
+
+    def deadline(self, default):
+        deadline = self.plugin.meta_info.deadline
+        return default if deadline is None else deadline
+
+
+class StreamBatch(object):
+    # items of a generator waiting to be delivered: the first one goes at once, the next ones at most a frame
+    # after the last delivery, by a timer when the generator blocks before the frame is over
+    def __init__(self, dispatch, token):
+        self.dispatch = dispatch
+        self.token = token
+        self.lock = threading.Lock()
+        self.items = []
+        self.flushed = 0
+        self.timer = None
+
+    def add(self, item):
+        with self.lock:
+            self.items.append(item)
+            wait = self.flushed + FRAME - time.perf_counter()
+            if wait <= 0:
+                self.deliver()
+            elif not self.timer:
+                self.timer = threading.Timer(wait, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            self.deliver()
+
+    def deliver(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if self.items and not self.token.cancelled:
+            self.dispatch.deliver(self.items)
+        self.items = []
+        self.flushed = time.perf_counter()
+
+
+class Dispatch(object):
+    # results that arrive after the deadline but before the first paint join the first paint,
+    # afterwards they are forwarded to the late callback
+    def __init__(self, token, on_late):
+        self.token = token
+        self.on_late = on_late
+        self.lock = threading.Lock()
+        self.painted = False
+        self.pending = []
+
+    def deliver(self, results):
+        if not results:
+            return
+        with self.lock:
+            if self.painted:
+                self.on_late(self.token, results)
+            else:
+                self.pending += results
+
+    def paint(self, results, emit):
+        with self.lock:
+            self.painted = True
+            emit(results + self.pending)
+            self.pending = []
+
+
+class QueryDispatcher(object):
+    """
+    Run all matched plugins of a query concurrently on a bounded worker pool, or on the asyncio loop
+    if their query is a coroutine or an async generator function. Results yielded by a generator are delivered
+    in batches at frame cadence, the first rows paint while the plugin is still producing the rest.
+    The first paint waits for each plugin at most its deadline, late plugins land through on_late.
+    Expensive global plugins are deferred or skipped by the GlobalScheduler.
+    """
+
+    def __init__(self, on_late, on_async, max_workers=8, deadline=0.1, global_pause=0.3, page_size=20):
+        self.on_late = on_late
+        self.on_async = on_async
+        self.deadline = deadline
+        # results created at once from a ResultSource, the model fetches the next pages
+        self.page_size = page_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+        # complete results of refinable plugins in the last query, keyed by (plugin, keyword)
+        self.last_results = {}
+        self.cache = ResultCache()
+        SettingInterface.reload_hooks.append(self.cache.invalidate)
+        self.stats = PerfStats()
+        self.async_loop = AsyncLoop()
+        self.scheduler = GlobalScheduler(self.stats, global_pause)
+
+    def dispatch(self, matched_plugins, token, parent, emit, instant=False):
+        dispatch = Dispatch(token, self.on_late)
+        tasks, deferred = [], []
+        for plugin, keyword, text in matched_plugins:
+            task = QueryTask(plugin, keyword, text)
+            if not instant:  # a refresh asked by the plugin must query it again
+                task.items = self.cache.get(plugin, keyword, text)
+                if task.items is None:
+                    task.items = self.refine(task)
+            if task.items is None and keyword == "*" and not instant:
+                decision = self.scheduler.decide(plugin)
+                if decision == DEFER:
+                    deferred.append(task)
+                if decision in (DEFER, SKIP):
+                    continue
+            if task.items is None and self.is_coroutine(plugin):
+                task.future = self.async_loop.submit(self.query_coroutine(task, token, dispatch))
+                token.add_callback(task.future.cancel)
+            elif task.items is None:
+                task.future = self.executor.submit(self.query, task, token, parent, dispatch)
+            tasks.append(task)
+
+        start = time.perf_counter()
+        result, async_tasks, late = [], [], []
+        last_results = {}
+        for task in tasks:
+            if task.future:
+                timeout = max(0, start + task.deadline(self.deadline) - time.perf_counter())
+                try:
+                    self.complete(task, task.future.result(timeout))
+                except TimeoutError:
+                    late.append(task)
+                    continue
+                except CancelledError:
+                    continue
+            if not task.streamed:
+                result += task.items
+            if task.async_thread:
+                async_tasks.append(task)
+            elif task.plugin.meta_info.refinable:
+                last_results[(task.plugin, task.keyword)] = (task.text, task.items)
+        self.last_results = last_results
+
+        dispatch.paint(result, emit)
+        # async threads are started after the first paint, so their results won't be cleared by it
+        self.start_async(token, async_tasks)
+        for task in late:
+            task.future.add_done_callback(lambda future, task=task: self.deliver_late(dispatch, task, future))
+        for task in deferred:
+            task.future = self.executor.submit(self.query_deferred, task, token, parent, dispatch)
+            task.future.add_done_callback(lambda future, task=task: self.deliver_late(dispatch, task, future))
+
+    def complete(self, task, query_result):
+        task.items, task.async_thread = query_result
+        # a ResultSource pages on from where the list stopped, results holding one aren't cached
+        if not task.async_thread and not task.failed and not any(isinstance(item, ResultSource) for item in task.items):
+            self.cache.put(task.plugin, task.keyword, task.text, task.items)
+
+    def refine(self, task):
+        # the text only grows, so the plugin can narrow its last results instead of being queried again
+        last = self.last_results.get((task.plugin, task.keyword))
+        if not last or not task.text.startswith(last[0]):
+            return None
+        try:
+            return task.plugin.refine(task.keyword, task.text, last[1])
+        except BaseException as e:
+            log.error("插件结果过滤失败：{} {}".format(task.plugin.meta_info.name, e))
+            self.stats.record_exception(task.plugin)
+            return None
+
+    def deliver_late(self, dispatch, task, future):
+        if future.cancelled():
+            return
+        self.complete(task, future.result())
+        if dispatch.token.cancelled:
+            return
+        if not task.streamed:
+            dispatch.deliver(task.items)
+        if task.async_thread:
+            self.start_async(dispatch.token, [task])
+
+    def start_async(self, token, tasks):
+        if token.cancelled:
+            return
+        for task in tasks:
+            self.on_async(task.async_thread, lambda _, results, task=task: self.complete_async(task, results))
+
+    def complete_async(self, task, results):
+        self.stats.record_async(task.plugin, time.perf_counter() - task.start, len(results))
+        # the async results are cached together with the ones returned at once
+        self.cache.put(task.plugin, task.keyword, task.text, task.items + results)
+
+    def query_deferred(self, task, token, parent, dispatch):
+        # an expensive global plugin runs only once the typing paused
+        if token.wait(self.scheduler.pause):
+            task.failed = True
+            return [], None
+        return self.query(task, token, parent, dispatch)
+
+    def query(self, task, token, parent, dispatch):
+        plugin = task.plugin
+        if token.cancelled:  # superseded before the worker picked it up
+            task.failed = True
+            return [], None
+        if isinstance(plugin, LazyPlugin) and not plugin.load():  # the first query needing it imports it
+            task.failed = True
+            return [], None
+        if self.is_coroutine(plugin):  # loaded just now, or deferred
+            future = self.async_loop.submit(self.query_coroutine(task, token, dispatch))
+            token.add_callback(future.cancel)
+            try:
+                return future.result()
+            except CancelledError:
+                task.failed = True
+                return [], None
+        task.start = time.perf_counter()
+        try:
+            if plugin.meta_info.async_result:
+                items, async_thread = plugin.query(task.keyword, task.text, token, parent)
+                items = items or []
+            else:
+                items, async_thread = plugin.query(task.keyword, task.text) or [], None
+            if inspect.isgenerator(items):
+                items = self.stream(task, items, token, dispatch)
+            elif isinstance(items, ResultSource):
+                # the first page is streamed, the source follows it for the next pages
+                source = items
+                items = self.stream(task, source.page(self.page_size), token, dispatch)
+                if not source.done and not task.failed:
+                    dispatch.deliver([source])
+                    items.append(source)
+            else:
+                items = self.strip_no_cache(task, items)
+        except BaseException as e:
+            log.error("插件查询失败：{} {}".format(plugin.meta_info.name, e))
+            self.stats.record_exception(plugin)
+            task.failed = True
+            return [], None
+        if token.cancelled:  # the plugin may have given up early
+            task.failed = True
+        self.stats.record_query(plugin, time.perf_counter() - task.start, len(items))
+        return items, async_thread
+
+    @staticmethod
+    def stream(task, items, token, dispatch):
+        # -> all the items of the generator, which were delivered in batches, see StreamBatch
+        results, batch = [], StreamBatch(dispatch, token)
+        for item in items:
+            if token.cancelled:
+                items.close()
+                batch.flush()
+                task.failed = True
+                return []
+            if item is NO_CACHE:
+                task.failed = True
+                continue
+            results.append(item)
+            batch.add(item)
+        task.streamed = True
+        batch.flush()
+        return results
+
+    @staticmethod
+    async def stream_async(task, items, token, dispatch):
+        # -> all the items of the async generator, delivered in batches like the ones of a generator
+        results, batch = [], StreamBatch(dispatch, token)
+        try:
+            async for item in items:
+                if item is NO_CACHE:
+                    task.failed = True
+                    continue
+                results.append(item)
+                batch.add(item)
+        finally:
+            batch.flush()
+        task.streamed = True
+        return results
+
+    @staticmethod
+    def strip_no_cache(task, items):
+        if any(item is NO_CACHE for item in items):
+            task.failed = True
+            items = [item for item in items if item is not NO_CACHE]
+        return items
+
+    async def query_coroutine(self, task, token, dispatch):
+        if token.cancelled:
+            task.failed = True
+            return [], None
+        task.start = time.perf_counter()
+        try:
+            items = task.plugin.query(task.keyword, task.text, token)
+            if inspect.isasyncgen(items):
+                items = await self.stream_async(task, items, token, dispatch)
+            else:
+                items = self.strip_no_cache(task, await items or [])
+        except Exception as e:  # a cancelled coroutine raises CancelledError, which isn't an Exception
+            log.error("插件查询失败：{} {}".format(task.plugin.meta_info.name, e))
+            self.stats.record_exception(task.plugin)
+            task.failed = True
+            return [], None
+        self.stats.record_query(task.plugin, time.perf_counter() - task.start, len(items))
+        return items, None
+
+    @staticmethod
+    def is_coroutine(plugin):
+        if isinstance(plugin, LazyPlugin):
+            plugin = plugin.plugin
+        return plugin is not None and (inspect.iscoroutinefunction(plugin.query) or
+                                       inspect.isasyncgenfunction(plugin.query))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        self.async_loop.stop()
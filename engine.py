@@ -0,0 +1,247 @@
+import importlib
+import inspect
+import os
+import sys
+import threading
+from concurrent.futures import Future
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugin"))
+from plugin_api import AbstractPlugin, ContextApi, SettingInterface, CancelToken, get_logger
+
+from debounce import DebounceScheduler
+from dispatcher import QueryDispatcher
+from frecency import FrecencyStore
+from keyword_router import KeywordRouter
+from perf_stats import StartupTimeline
+from plugin_host import PluginHostPool, IsolatedPlugin
+from plugin_loader import PluginManifest, LazyPlugin
+from result_model import ResultItem
+
+log = get_logger("Engine")
+
+
+class QueryEngine(object):
+    """
+    Qt free core of Beefalo: plugin discovery, keyword routing, dispatch and result merging.
+    The view gets the results through callbacks, which may be called from worker threads:
+        on_results(results): the first paint of a query
+        on_late(token, results): results of the query arriving after the first paint
+        on_async(async_thread, on_results): start an async thread returned by a plugin
+        invoke(call): run an api call of an isolated plugin on the thread of the api, directly by default
+    Plugins with a manifest.json are imported the first time a query needs them, see PluginManifest.
+    Plugins use paths relative to the Beefalo folder, so it must be the working directory.
+    """
+
+    def __init__(self, get_setting, on_results, on_late, on_async=None, timeline=None, invoke=None):
+        self.get_setting = get_setting
+        self.on_results = on_results
+        self.api = None
+        self.token = None
+        # text of the latest query
+        self.text = ""
+        self.plugin_types = []
+        self.setting_plugins = []
+        # PluginManifest or plugin type of every plugin folder, in folder order
+        self.discovered = []
+        # loaded plugins, or LazyPlugin for those not loaded yet
+        self.plugins = []
+        self.lock = threading.Lock()
+        self.router = KeywordRouter()
+        self.scheduler = DebounceScheduler(get_setting("debounce_interval") / 1000)
+        self.dispatcher = QueryDispatcher(on_late, on_async or self.run_async, get_setting("query_workers"),
+                                          get_setting("query_deadline") / 1000, get_setting("global_pause") / 1000,
+                                          get_setting("result_page"))
+        SettingInterface.reload_hooks.append(self.router.invalidate)
+        self.timeline = timeline or StartupTimeline()
+        self.host_pool = PluginHostPool(get_setting("plugin_hosts"), get_setting("plugin_host_timeout") / 1000, invoke)
+        self.dispatcher.stats.timeline = self.timeline
+        self.frecency = FrecencyStore("frecency.log")
+
+    def discover_plugins(self):
+        with self.timeline.span("discover", "plugins"):
+            return self.discover()
+
+    def discover(self):
+        plugins_dir = self.get_setting("plugins_dir")
+        for plugin_dir in os.listdir(plugins_dir):
+            if os.path.isdir(os.path.join(plugins_dir, plugin_dir)) and plugin_dir not in self.get_setting(
+                    "exclude_plugin_dir"):
+                # append plugin's folder path
+                sys.path.append(os.path.join(plugins_dir, plugin_dir))
+                try:
+                    manifest = PluginManifest.load(os.path.join(plugins_dir, plugin_dir), self.get_setting("language"))
+                except BaseException as e:
+                    log.error("插件清单读取失败：{} {}".format(plugin_dir, e))
+                    manifest = None
+                if manifest:
+                    self.discovered.append(manifest)
+                    continue
+                # plugins without manifest are imported at once
+                plugin_module = self.import_plugin(plugin_dir)
+                for att in dir(plugin_module):
+                    try:
+                        att_type = getattr(plugin_module, att)
+                        if AbstractPlugin in inspect.getmro(att_type):
+                            att_type.meta_info.path = os.path.join(plugins_dir, plugin_dir)
+                            self.discovered.append(att_type)
+                    except BaseException as e:
+                        pass
+        return self.discovered
+
+    def import_plugin(self, plugin_dir):
+        plugins_dir = self.get_setting("plugins_dir")
+        try:
+            with self.timeline.span("import", plugin_dir):
+                return importlib.import_module("%s.%s" % (plugins_dir, plugin_dir))
+        except BaseException as e:
+            log.error("插件导入失败：{} {}".format(plugin_dir, e))
+            return None
+
+    def load_plugins(self, api: ContextApi):
+        self.api = api
+        self.api.router = self.router
+        self.api.stats = self.dispatcher.stats
+        self.api.load_plugin = self.resolve_plugin
+        self.api.load_setting_plugins = self.load_setting_plugins
+        # independent plugins are loaded concurrently on the worker pool,
+        # the ones working on the GUI and those without manifest are loaded on this (main) thread meanwhile
+        with self.timeline.span("load", "plugins"):
+            plugins = []
+            for entry in self.discovered:
+                if isinstance(entry, PluginManifest) and not entry.eager:
+                    plugins.append(LazyPlugin(entry, self.load_manifest))
+                elif isinstance(entry, PluginManifest) and not entry.main_thread:
+                    plugins.append(self.dispatcher.executor.submit(self.load_manifest, entry))
+                else:
+                    plugins.append(entry)
+            for index, entry in enumerate(plugins):
+                if isinstance(entry, PluginManifest):
+                    plugins[index] = self.load_manifest(entry)
+                elif inspect.isclass(entry):
+                    plugins[index] = self.construct(entry)
+            plugins = [plugin.result() if isinstance(plugin, Future) else plugin for plugin in plugins]
+        self.plugins = [plugin for plugin in plugins if plugin]
+        self.router.build(self.plugins)
+
+    def load_manifest(self, manifest: PluginManifest):
+        plugin_module = self.import_plugin(os.path.basename(manifest.path))
+        if not plugin_module:
+            return None
+        plugin_type = getattr(plugin_module, manifest.class_name, None)
+        if not plugin_type:
+            log.error("插件导入失败：{} 没有 {}".format(manifest.path, manifest.class_name))
+            return None
+        plugin_type.meta_info.path = manifest.path
+        manifest.apply(plugin_type.meta_info)
+        plugin = self.construct(plugin_type)
+        if plugin and self.router.plugins:
+            # loaded on demand, its keywords may differ from the manifest
+            self.router.invalidate()
+        return plugin
+
+    def construct(self, plugin_type):
+        try:
+            with self.timeline.span("construct", plugin_type.__name__):
+                if plugin_type.meta_info.isolated:
+                    plugin = IsolatedPlugin(plugin_type, self.host_pool, self.api)
+                else:
+                    plugin = plugin_type(self.api)
+        except BaseException as e:
+            log.error("插件初始化失败：{} {}".format(plugin_type.__name__, e))
+            return None
+        with self.lock:
+            self.plugin_types.append(plugin_type)
+            if isinstance(plugin, SettingInterface) and plugin.edit:
+                self.setting_plugins.append(plugin)
+                # keep the order of the plugin folders, whenever they are loaded
+                paths = [entry.path if isinstance(entry, PluginManifest) else entry.meta_info.path
+                         for entry in self.discovered]
+                self.setting_plugins.sort(key=lambda plugin: paths.index(plugin.meta_info.path)
+                                          if plugin.meta_info.path in paths else len(paths))
+        return plugin
+
+    def resolve_plugin(self, plugin):
+        # the loaded plugin of a router entry, None if it can't be loaded
+        return plugin.load() if isinstance(plugin, LazyPlugin) else plugin
+
+    def load_setting_plugins(self):
+        for plugin in self.plugins:
+            if isinstance(plugin, LazyPlugin) and plugin.manifest.setting:
+                plugin.load()
+        return self.setting_plugins
+
+    def query(self, query, instant=False):
+        if self.token:
+            self.token.cancel()  # abandon the work of the superseded query
+        self.token = CancelToken()
+        self.text = query
+        matched_plugins = self.router.route(query)
+        if matched_plugins:
+            self.dispatcher.dispatch(matched_plugins, self.token, None, self.on_results, instant)
+        else:
+            self.on_results([])
+        return self.token
+
+    def record_pick(self, item):
+        # the user picked a result, it's ranked higher after the same text,
+        # and it teaches the scheduler which global plugins are worth running
+        self.frecency.record(self.text, item.identity())
+        for plugin in self.plugins:
+            if plugin.meta_info is item.plugin_info:
+                self.dispatcher.stats.record_pick(plugin)
+                return
+
+    def frecency_score(self, item):
+        return self.frecency.score(self.text, item.identity())
+
+    def trigger(self, query, instant=False):
+        self.scheduler.trigger((query, instant), instant)
+
+    def run(self):
+        # the debounced query loop, returns after stop()
+        while True:
+            payload = self.scheduler.wait()
+            if payload is None:
+                break
+            self.query(*payload)
+
+    def stop(self):
+        self.scheduler.close()
+        self.dispatcher.shutdown()
+        self.host_pool.shutdown()
+        self.frecency.flush()
+
+    def run_async(self, async_thread, on_results):
+        # without a Qt event loop, run the body of the thread in a worker and take its signal directly
+        from PyQt5.QtCore import Qt
+        async_thread.sin_out.connect(self.dispatcher.on_late, Qt.DirectConnection)
+        async_thread.sin_out.connect(on_results, Qt.DirectConnection)
+        self.dispatcher.executor.submit(async_thread.run)
+
+
+def stub_api(engine: QueryEngine, language="zh"):
+    # a ContextApi without window, for running the engine headless
+    def ignore(*args, **kwargs):
+        pass
+
+    return ContextApi(lambda text: engine.trigger(text, True), ignore, ignore, engine.plugin_types, dict,
+                      lambda results, instant=False: engine.on_results(results), ignore, ignore, ignore, ignore,
+                      engine.setting_plugins, language, None, 0)
+
+
+if __name__ == '__main__':
+    # python engine.py "<query>": print the results of a query without window
+    import json
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    setting = json.load(open("setting.json", encoding="utf-8"))
+    def show(results):
+        for item in results:
+            if isinstance(item, ResultItem):  # not the ResultSource of the further pages
+                print(item.title, item.subTitle)
+
+    engine = QueryEngine(setting.get, show, lambda token, results: show(results))
+    engine.discover_plugins()
+    engine.load_plugins(stub_api(engine, setting.get("language")))
+    engine.query(" ".join(sys.argv[1:]))
+    engine.stop()
@@ -0,0 +1,110 @@
+import json
+import os
+import threading
+import time
+
+from plugin_api import get_logger
+
+log = get_logger("Frecency")
+
+
+class FrecencyStore(object):
+    """
+    Which results the user picked after typing which text, for ranking them higher the next time.
+    A pick adds 1 to the score of the result under every prefix of the typed text, scores halve every half_life
+    seconds, so a lookup is two dict accesses. Picks are appended to a log file a few seconds after them,
+    the log is compacted into one line per (text, result) once it grew much longer than that.
+    """
+    MAX_PREFIX = 32
+
+    def __init__(self, path, half_life=14 * 24 * 3600, flush_delay=5):
+        self.path = path
+        self.half_life = half_life
+        self.flush_delay = flush_delay
+        self.lock = threading.Lock()
+        # prefix -> {identity: (score, time)}
+        self.entries = {}
+        # (text, identity) -> (score, time), what the compacted log holds
+        self.picks = {}
+        self.pending = []
+        self.timer = None
+        self.lines = 0
+        self.load()
+
+    def decay(self, score, since, now):
+        return score * 0.5 ** ((now - since) / self.half_life)
+
+    def normalize(self, text):
+        return text.strip().lower()[:self.MAX_PREFIX]
+
+    def apply(self, at, text, identity, score):
+        old, since = self.picks.get((text, identity), (0, at))
+        self.picks[(text, identity)] = (self.decay(old, since, at) + score, at)
+        for end in range(1, len(text) + 1):
+            entries = self.entries.setdefault(text[:end], {})
+            old, since = entries.get(identity, (0, at))
+            entries[identity] = (self.decay(old, since, at) + score, at)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    self.apply(*json.loads(line))
+                    self.lines += 1
+        except BaseException as e:
+            log.error("使用记录读取失败：{}".format(e))
+        if self.lines > 2 * len(self.picks) + 100:
+            self.compact()
+
+    def record(self, text, identity):
+        text = self.normalize(text)
+        if not text:
+            return
+        entry = [time.time(), text, identity, 1]
+        with self.lock:
+            self.apply(*entry)
+            self.pending.append(entry)
+            if not self.timer:
+                self.timer = threading.Timer(self.flush_delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def score(self, text, identity):
+        entries = self.entries.get(self.normalize(text))
+        if not entries or identity not in entries:
+            return 0
+        score, since = entries[identity]
+        return self.decay(score, since, time.time())
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending, self.timer = self.pending, [], None
+            if not pending:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    for entry in pending:
+                        file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self.lines += len(pending)
+            except BaseException as e:
+                log.error("使用记录保存失败：{}".format(e))
+            if self.lines > 2 * len(self.picks) + 100:
+                self.compact()
+
+    def compact(self):
+        # one line per (text, result) with its decayed score, the forgotten ones are dropped
+        now = time.time()
+        lines = []
+        for (text, identity), (score, since) in self.picks.items():
+            score = self.decay(score, since, now)
+            if score >= 0.01:
+                lines.append(json.dumps([now, text, identity, score], ensure_ascii=False) + "\n")
+        try:
+            with open(self.path + ".tmp", "w", encoding="utf-8") as file:
+                file.writelines(lines)
+            os.replace(self.path + ".tmp", self.path)
+            self.lines = len(lines)
+        except BaseException as e:
+            log.error("使用记录压缩失败：{}".format(e))
@@ -0,0 +1,41 @@
+RUN, DEFER, SKIP = "run", "defer", "skip"
+
+
+class GlobalScheduler(object):
+    """
+    Decides how a global ("*") plugin takes part in a query, from its measured cost and yield
+    (how often it returns results, and how often they are picked):
+        RUN: cheap or high yield, it joins the first paint
+        DEFER: expensive and low yield, it runs once typing paused for `pause` seconds
+        SKIP: slower than `skip_cost` and nearly never useful, it only runs now and then to keep learning
+    Plugins are run until `min_samples` queries were measured.
+    """
+
+    def __init__(self, stats, pause=0.3, cheap=0.02, skip_cost=1, min_samples=20, high_yield=0.3, low_yield=0.02,
+                 explore=20):
+        self.stats = stats
+        self.pause = pause
+        self.cheap = cheap
+        self.skip_cost = skip_cost
+        self.min_samples = min_samples
+        self.high_yield = high_yield
+        self.low_yield = low_yield
+        self.explore = explore
+        self.skipped = {}
+
+    def yield_rate(self, stats):
+        # a pick counts more than results that were only looked at
+        return min(1, stats.hit_rate() + 3 * stats.picks / stats.queries)
+
+    def decide(self, plugin):
+        stats = self.stats.plugins.get(plugin)
+        if not stats or stats.queries < self.min_samples:
+            return RUN
+        cost, yield_rate = stats.cost() / 1000, self.yield_rate(stats)
+        if cost <= self.cheap or yield_rate >= self.high_yield:
+            return RUN
+        if cost > self.skip_cost and yield_rate < self.low_yield:
+            skipped = self.skipped[plugin] = self.skipped.get(plugin, 0) + 1
+            if skipped % self.explore:
+                return SKIP
+        return DEFER
@@ -0,0 +1,111 @@
+import re
+
+
+class TrieNode(object):
+    def __init__(self):
+        self.children = {}
+        # plugins registered with the keyword ending at this node
+        self.plugins = []
+        # (plugin order, keyword order, keyword, plugin) of all keywords below this node, sorted
+        self.completions = []
+
+
+class KeywordRouter(object):
+    """
+    Keyword trie built from the loaded plugins. It answers the matched plugins of a query, and the keywords
+    starting with a text for hints. It's rebuilt lazily after a plugin reloaded its setting.
+    The triggers of the global plugins are compiled into one regex, a global query calls only the plugins
+    whose trigger matches.
+    """
+
+    def __init__(self):
+        self.plugins = []
+        self.root = TrieNode()
+        # (plugin, group of its trigger in global_trigger, None if it takes all global queries)
+        self.global_plugins = []
+        self.global_trigger = None
+        self.dirty = False
+
+    def build(self, plugins):
+        self.plugins = list(plugins)
+        root, global_plugins = TrieNode(), []
+        for plugin_order, plugin in enumerate(self.plugins):
+            keywords = plugin.meta_info.keywords
+            if not keywords or "*" in keywords:
+                trigger = plugin.meta_info.trigger
+                global_plugins.append((plugin, "p{}".format(plugin_order) if trigger else None))
+            for keyword_order, keyword in enumerate(keywords or []):
+                if keyword == "*":
+                    continue
+                completion = (plugin_order, keyword_order, keyword, plugin)
+                node = root
+                node.completions.append(completion)
+                for char in keyword:
+                    node = node.children.setdefault(char, TrieNode())
+                    node.completions.append(completion)
+                node.plugins.append(plugin)
+        self.sort_completions(root)
+        # every trigger is an optional lookahead, its empty group is set if its conditions hold
+        expression = "".join("(?:(?={}(?P<{}>)))?".format(plugin.meta_info.trigger.expression(), group)
+                             for plugin, group in global_plugins if group)
+        self.root, self.global_plugins = root, global_plugins
+        self.global_trigger = re.compile(expression) if expression else None
+        self.dirty = False
+
+    def sort_completions(self, node):
+        node.completions.sort(key=lambda completion: completion[:2])
+        for child in node.children.values():
+            self.sort_completions(child)
+
+    def invalidate(self, plugin=None):
+        # keywords may change after the setting reloaded (e.g. web search engines), rebuild before the next route
+        self.dirty = True
+
+    def find(self, text):
+        node = self.root
+        for char in text:
+            node = node.children.get(char)
+            if not node:
+                return None
+        return node
+
+    def route(self, query):
+        # -> [(plugin, keyword, text)]
+        if self.dirty:
+            self.build(self.plugins)
+        if not query.strip():
+            return []
+        keyword_end = 0
+        node = self.root
+        while keyword_end < len(query) and not query[keyword_end].isspace():
+            node = node.children.get(query[keyword_end]) if node else None
+            keyword_end += 1
+
+        matched_plugins = []
+        if keyword_end and node and node.plugins:
+            text_start = keyword_end
+            while text_start < len(query) and query[text_start].isspace():
+                text_start += 1
+            keyword, text = query[:keyword_end], query[text_start:]
+            matched_plugins = [(plugin, keyword, text) for plugin in node.plugins]
+            if text_start > keyword_end:  # there is a space after the keyword, it's not a global query
+                return matched_plugins
+        return matched_plugins + [(plugin, "*", query) for plugin in self.triggered(query)]
+
+    def triggered(self, query):
+        match = self.global_trigger.match(query) if self.global_trigger else None
+        return [plugin for plugin, group in self.global_plugins if not group or match.group(group) is not None]
+
+    def complete(self, text):
+        # -> [(keyword, plugin)], the first keyword of each plugin starting with the text but not equal to it
+        if self.dirty:
+            self.build(self.plugins)
+        node = self.find(text)
+        if not node:
+            return []
+        completions, completed = [], set()
+        for _, _, keyword, plugin in node.completions:
+            if keyword != text and plugin not in completed:
+                completed.add(plugin)
+                completions.append((keyword, plugin))
+        return completions
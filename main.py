@@ -1,18 +1,16 @@
-import inspect
+import multiprocessing
 import os
 import sys
-import uuid
-import time
-import ctypes
-import re
-import importlib
+
+from perf_stats import StartupTimeline
+
+# created before the heavy imports, it's the origin of the startup timeline
+startup_timeline = StartupTimeline()
 
 import requests
-import win32con
 from PyQt5.QtMultimedia import QMediaPlayer
-from win32process import SuspendThread, ResumeThread
 
-from PyQt5.QtCore import pyqtSignal, QThread, QObject, QEvent, Qt
+from PyQt5.QtCore import pyqtSignal, QThread, QObject, QEvent, Qt, QTimer
 from PyQt5.QtGui import QCursor, QKeySequence, QIcon, QFontDatabase
 from PyQt5.QtWidgets import (QWidget, QApplication, QShortcut, QDesktopWidget, QLineEdit, QVBoxLayout, QListView,
                              QSizePolicy, QSystemTrayIcon, QMenu, QAction, QProgressBar)
@@ -20,11 +18,14 @@ from PyQt5.QtWidgets import (QWidget, QApplication, QShortcut, QDesktopWidget, Q
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 sys.path.append("plugin")
-from plugin_api import AbstractPlugin, ContextApi, SettingInterface, PluginInfo, get_logger
+from plugin_api import ContextApi, SettingInterface, PluginInfo, get_logger
 
 from keyboard import Hotkey
 from result_list import ResultListModel, WidgetDelegate
 from gui_size import WindowSize, ItemSize, SizeScale
+from engine import QueryEngine
+
+startup_timeline.mark("imports")
 
 # load plugin api from folder.
 # For plugin development, just need to add the plugin api folder to path.
@@ -43,7 +44,9 @@ class BeefaloWidget(QWidget, SettingInterface):
         QFontDatabase.addApplicationFont("resources/fontawesome-regular.ttf")
 
         # define ui widgets
-        self.result_model = ResultListModel(self)
+        self.result_model = ResultListModel(self, self.get_setting("result_max"),
+                                            lambda item: self.engine.frecency_score(item),
+                                            self.get_setting("result_page"))
         self.result_model.sin_out.connect(self.adjust_size)
         self.ws_listview = QListView()
         self.ws_progress_bar = QProgressBar()
@@ -53,27 +56,32 @@ class BeefaloWidget(QWidget, SettingInterface):
         self.ws_input = QLineEdit(self)  # 整型文本框
         self.ws_input.installEventFilter(self)
         self.m_size = None
-        self.delegate = WidgetDelegate(self.result_model, None)
+        self.delegate = WidgetDelegate(self.result_model, None, row_cache=self.get_setting("row_cache"))
         self.theme = {}
         self.instant = False
         
         self.clipboard_changed = False
+        # async results arriving within a frame are added to the model at once
+        self.late_results = []
+        self.late_timer = QTimer(self)
+        self.late_timer.setSingleShot(True)
+        self.late_timer.setInterval(16)
+        self.late_timer.timeout.connect(self.flush_late_results)
 
         self.hotKeys = Hotkey(self.get_setting("hotkeys"))
         self.add_global_hotkey()
 
         # load plugins
         self.api = None
-        self.plugins = {"*": []}
-        self.plugin_types = []
-        self.setting_plugins = []
+        self.debounce_thread = DebounceThread(self)
+        self.debounce_thread.sin_out.connect(self.async_change_result)
+        self.engine = QueryEngine(self.get_setting, self.debounce_thread.sin_out.emit,
+                                  self.debounce_thread.sin_late.emit, self.debounce_thread.start_async_thread,
+                                  startup_timeline, self.debounce_thread.sin_invoke.emit)
         self.load_plugins()
-        self.token = None
         self.player = QMediaPlayer(self)  # 1
 
         self.installEventFilter(self)
-        self.debounce_thread = DebounceThread(self)
-        self.debounce_thread.sin_out.connect(self.async_change_result)
         self.debounce_thread.start()
 
         self.result_size = min(10, max(4, self.get_setting("result_size")))
@@ -81,7 +89,11 @@ class BeefaloWidget(QWidget, SettingInterface):
         self.init_ui()    
         
         QApplication.clipboard().dataChanged.connect(self.handle_clipboard_changed)
+        startup_timeline.mark("window")
     
+    def invoke(self, call):
+        call()
+
     def handle_clipboard_changed(self):
         self.clipboard_changed=True    
 
@@ -90,44 +102,15 @@ class BeefaloWidget(QWidget, SettingInterface):
         self.player.play()
 
     def load_plugins(self):
-        plugins_dir = self.get_setting("plugins_dir")
-        for plugin_dir in os.listdir(plugins_dir):
-            if os.path.isdir(os.path.join(plugins_dir, plugin_dir)) and plugin_dir not in self.get_setting(
-                    "exclude_plugin_dir"):
-                # append plugin's folder path
-                sys.path.append(os.path.join(plugins_dir, plugin_dir))
-                plugin_module = importlib.import_module("%s.%s" % (plugins_dir, plugin_dir))
-                for att in dir(plugin_module):
-                    try:
-                        att_type = getattr(plugin_module, att)
-                        if AbstractPlugin in inspect.getmro(att_type):
-                            att_type.meta_info.path = os.path.join(plugins_dir, plugin_dir)
-                            self.plugin_types.append(att_type)
-                    except BaseException as e:
-                        pass
-
+        self.engine.discover_plugins()
         self.api = ContextApi(self.set_input_text, sys_tray.showMessage,
-                              self.change_theme, self.plugin_types,
+                              self.change_theme, self.engine.plugin_types,
                               self.get_theme,
-                              self.async_change_result, self.change_selected_result,
+                              self.change_results, self.change_selected_result,
                               self.start_progress, self.end_progress,
                               self.play_media,
-                              self.setting_plugins, self.get_setting("language"), None,self.winId())
-
-        for plugin_type in self.plugin_types:
-            plugin = plugin_type(self.api)
-            if SettingInterface in inspect.getmro(plugin_type) and plugin.edit:
-                self.setting_plugins.append(plugin)
-            # log.info("插件初始化：{}".format(plugin.meta_info.name))
-            if len(plugin.meta_info.keywords):
-                for keyword in plugin.meta_info.keywords:
-                    if self.plugins.get(keyword):
-                        self.plugins[keyword].append(plugin)
-                    else:
-                        self.plugins[keyword] = [plugin]
-            else:
-                # add plugin to global
-                self.plugins["*"].append(plugin)
+                              self.engine.setting_plugins, self.get_setting("language"), None,self.winId())
+        self.engine.load_plugins(self.api)
 
     def init_ui(self):
 
@@ -224,6 +207,7 @@ class BeefaloWidget(QWidget, SettingInterface):
         self.setStyleSheet(css)
         self.theme = theme
         self.delegate.theme = theme
+        self.delegate.compile()
 
     def get_theme(self):
         return self.theme
@@ -255,6 +239,8 @@ class BeefaloWidget(QWidget, SettingInterface):
             self.setVisible(True)
             self.activateWindow()
             self.ws_input.setFocus()
+            if startup_timeline.mark("first show"):
+                log.info("启动时间线：\n{}".format(startup_timeline.report()))
             
             text=QApplication.clipboard().text()
             if self.clipboard_changed and len(text)>0:
@@ -271,6 +257,7 @@ class BeefaloWidget(QWidget, SettingInterface):
         self.api.size_scale = size_scale
         self.m_size = WindowSize(size_scale)
         self.delegate.i_size = ItemSize(size_scale)
+        self.delegate.compile()
         self.result_item_height = self.delegate.i_size.height
         self.setGeometry(0, 0, int(self.m_size.main_width),
                          int(self.m_size.editor_height + self.m_size.main_padding[1] * 2
@@ -321,10 +308,22 @@ class BeefaloWidget(QWidget, SettingInterface):
         self.ws_input.setText("")
 
     def async_add_results(self, token, results):
-        if token == self.token:
-            self.result_model.addItems(results)
+        if token == self.engine.token:
+            self.late_results += results
+            if not self.late_timer.isActive():
+                self.late_timer.start()
+
+    def flush_late_results(self):
+        results, self.late_results = self.late_results, []
+        self.result_model.addItems(results)
+
+    def change_results(self, results, instant=False):
+        # the model and the late timer are only touched on the main thread
+        self.debounce_thread.sin_change.emit(results, bool(instant))
 
     def async_change_result(self, results,instant=False):
+        self.late_results = []  # of the superseded query
+        self.late_timer.stop()
         self.result_model.changeItems(results, self.instant or instant)
         self.instant = False
         if self.result_model.select.row > -1:  # selected row may has been changed
@@ -356,6 +355,7 @@ class BeefaloWidget(QWidget, SettingInterface):
                 self.result_model.select.selected_menu = -1
             self.repaint_selected_item()
         else:
+            self.prefetch()
             self.handle_result_selected(self.result_model.create_index(1))
 
     def selected_page_up(self):
@@ -370,6 +370,7 @@ class BeefaloWidget(QWidget, SettingInterface):
     def selected_page_down(self):
         if self.result_model.rowCount() == 0:
             return
+        self.prefetch()
         # page down 不需要循环
         if self.result_model.create_index().row()\
             +self.result_size>=self.result_model.rowCount():
@@ -377,6 +378,12 @@ class BeefaloWidget(QWidget, SettingInterface):
         else:
             self.handle_result_selected(self.result_model.create_index(self.result_size))
 
+    def prefetch(self):
+        # the next page of the results is fetched before the selection reaches the end of the list
+        if self.result_model.select.row + 2 * self.result_size >= self.result_model.rowCount() \
+                and self.result_model.canFetchMore():
+            self.result_model.fetchMore()
+
     def repaint_selected_item(self):
         # when change the selected row's style and display or hide it's menus
         cur = self.result_model.create_index()
@@ -385,9 +392,7 @@ class BeefaloWidget(QWidget, SettingInterface):
         self.ws_listview.scrollTo(self.result_model.create_index())
 
     def handle_text_changed(self):
-        if self.debounce_thread.pause:
-            self.debounce_thread.resume()
-        self.debounce_thread.work = False
+        self.engine.trigger(self.ws_input.text(), self.instant)
 
     def handle_result_selected(self, index):
         old = self.result_model.create_index()
@@ -408,6 +413,7 @@ class BeefaloWidget(QWidget, SettingInterface):
                 action = index.action
             else:
                 action = index.menus[self.result_model.select.selected_menu].action
+            self.engine.record_pick(index)
             if action.close:
                 self.change_visible()
             if action.method:
@@ -435,71 +441,32 @@ class BeefaloWidget(QWidget, SettingInterface):
 
 
 class DebounceThread(QThread):
+    # runs the debounced query loop of the engine, and brings its results to the main thread
     sin_out = pyqtSignal([list])
+    sin_late = pyqtSignal([str, list])
+    # api calls of isolated plugins, run on the main thread
+    sin_invoke = pyqtSignal([object])
+    # api.change_results, called by plugins from their own threads too
+    sin_change = pyqtSignal([list, bool])
 
     def __init__(self, view: 'BeefaloWidget'):
         super(DebounceThread, self).__init__(view)
         self.view = view
-        self.work = False
-        self.pause = True
-        self.handle = None
+        self.sin_late.connect(self.view.async_add_results)
+        self.sin_invoke.connect(self.view.invoke)
+        self.sin_change.connect(self.view.async_change_result)
+        self.async_threads = set()
+
+    def start_async_thread(self, async_thread, on_results):
+        # the thread is created in a worker of the dispatcher without parent, keep it until finished
+        self.async_threads.add(async_thread)
+        async_thread.finished.connect(lambda: self.async_threads.discard(async_thread), Qt.DirectConnection)
+        async_thread.sin_out.connect(self.view.async_add_results)
+        async_thread.sin_out.connect(on_results, Qt.DirectConnection)
+        async_thread.start()
 
     def run(self):
-        self.obj = QObject()
-        try:
-            self.handle = ctypes.windll.kernel32.OpenThread(  # @UndefinedVariable
-                win32con.PROCESS_ALL_ACCESS, False, int(QThread.currentThreadId()))
-        except Exception as e:
-            log.error('get thread handle failed', e)
-            return
-        self.suspend()
-        self.work = True
-        self.pause = False
-        while True:
-            if not self.view.instant:
-                # sleep to debounce
-                time.sleep(0.05)
-            if self.work:
-                result = []
-                query = self.view.ws_input.text()
-                self.view.token = str(uuid.uuid1())
-                if len(query.strip()):
-                    pluginMath = re.match(r"([^\s]+)(\s*)(.*)", query)
-                    matched_plugins = []
-                    if pluginMath:
-                        groups = pluginMath.groups()
-                        if self.view.plugins.get(groups[0]):
-                            keyword, text = groups[0], groups[2]
-                            matched_plugins = [(plugin, keyword, text) for plugin in self.view.plugins.get(keyword)]
-                        if not groups[1]:  # there is not space, so add global plugins
-                            matched_plugins += [(plugin, "*", query) for plugin in self.view.plugins.get("*")]
-
-                    if not matched_plugins:  # haven't matched any plugins, just treat it as global query
-                        matched_plugins = [(plugin, "*", query) for plugin in self.view.plugins.get("*")]
-
-                    for matched in matched_plugins:
-                        plugin, keyword, text = matched
-                        if plugin.meta_info.async_result:
-                            item, asyncThread = plugin.query(keyword, text, self.view.token, self.obj)
-                            result += item
-                            if asyncThread:
-                                asyncThread.sin_out.connect(self.view.async_add_results)
-                                asyncThread.start()
-                        else:
-                            result += plugin.query(keyword, text)
-                self.sin_out.emit(result)
-                if self.work:
-                    self.suspend()
-            else:
-                self.work = True
-
-    def suspend(self):
-        self.pause = True
-        SuspendThread(self.handle)
-
-    def resume(self):
-        ResumeThread(self.handle)
-        self.pause = False
+        self.view.engine.run()
 
 
 global sys_tray
@@ -525,6 +492,7 @@ def start_app():
     show_action.triggered.connect(window.change_visible)
     exit_action = QAction(QIcon("images/exit.png"), u'退出', app)  # 添加一级菜单动作选项(退出程序)
     exit_action.triggered.connect(app.exit)
+    app.aboutToQuit.connect(window.engine.stop)
     sys_tray_menu.addAction(show_action)
     sys_tray_menu.addAction(exit_action)
     sys_tray.setContextMenu(sys_tray_menu)  # 把tpMenu设定为托盘的右键菜单
@@ -535,4 +503,5 @@ def start_app():
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # isolated plugins run in worker processes
     start_app()
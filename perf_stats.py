@@ -0,0 +1,183 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# upper bounds of the histogram buckets in ms, the last bucket counts everything slower
+BUCKETS = [0.5 * 2 ** i for i in range(16)]
+
+
+class Histogram(object):
+    """
+    Rolling histogram of durations with fixed exponential buckets. Samples of the current and the previous
+    window are kept, so old spikes fade out after two windows.
+    Recording only bumps a counter without locking: a racing bump may rarely be lost, which is fine for stats.
+    """
+
+    def __init__(self, window=300):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.window_start = time.monotonic()
+        self.current = [0] * (len(BUCKETS) + 1)
+        self.previous = [0] * (len(BUCKETS) + 1)
+
+    def record(self, seconds):
+        now = time.monotonic()
+        if now - self.window_start > self.window:
+            self.window_start = now
+            self.previous, self.current = self.current, [0] * (len(BUCKETS) + 1)
+        ms = seconds * 1000
+        bucket = 0
+        while bucket < len(BUCKETS) and ms > BUCKETS[bucket]:
+            bucket += 1
+        self.current[bucket] += 1
+
+    def counts(self):
+        return [current + previous for current, previous in zip(self.current, self.previous)]
+
+    def count(self):
+        return sum(self.counts())
+
+    def percentile(self, p):
+        # upper bound of the bucket holding the p-th percentile (ms), None without samples
+        counts = self.counts()
+        total = sum(counts)
+        if not total:
+            return None
+        rank = total * p / 100
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if count and seen >= rank:
+                return BUCKETS[bucket] if bucket < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class PluginStats(object):
+    def __init__(self):
+        self.query_time = Histogram()
+        self.async_time = Histogram()
+        self.queries = 0
+        self.results = 0
+        # queries with results, and results picked by the user
+        self.hits = 0
+        self.picks = 0
+        self.exceptions = 0
+
+    def average_results(self):
+        return self.results / self.queries if self.queries else 0
+
+    def hit_rate(self):
+        # async results are counted apart from the ones returned at once, so it's capped
+        return min(1, self.hits / self.queries) if self.queries else 0
+
+    def cost(self):
+        # p95 (ms) of the slower of the query and its async part
+        return max(self.query_time.percentile(95) or 0, self.async_time.percentile(95) or 0)
+
+
+class PerfStats(object):
+    """
+    Per plugin query time, result count, async completion time and exception count, recorded by the dispatcher.
+    Percentiles are only computed when somebody reads them.
+    """
+
+    def __init__(self):
+        self.plugins = {}
+        self.timeline = None
+
+    def get(self, plugin):
+        stats = self.plugins.get(plugin)
+        if stats is None:
+            stats = self.plugins.setdefault(plugin, PluginStats())
+        return stats
+
+    def record_query(self, plugin, seconds, results):
+        stats = self.get(plugin)
+        stats.query_time.record(seconds)
+        stats.queries += 1
+        stats.results += results
+        stats.hits += 1 if results else 0
+
+    def record_async(self, plugin, seconds, results):
+        stats = self.get(plugin)
+        stats.async_time.record(seconds)
+        stats.results += results
+        stats.hits += 1 if results else 0
+
+    def record_exception(self, plugin):
+        self.get(plugin).exceptions += 1
+
+    def record_pick(self, plugin):
+        self.get(plugin).picks += 1
+
+    def reset(self):
+        self.plugins = {}
+
+    def ranking(self):
+        # -> [(plugin, stats)], the slowest p95 first
+        return sorted(self.plugins.items(), key=lambda item: item[1].query_time.percentile(95) or 0, reverse=True)
+
+    def report(self):
+        lines = ["{:<24}{:>10}{:>10}{:>10}{:>12}{:>10}{:>10}{:>10}{:>10}".format(
+            "plugin", "queries", "p50", "p95", "async p95", "results", "hit rate", "picks", "errors")]
+        for plugin, stats in self.ranking():
+            lines.append("{:<24}{:>10}{:>10}{:>10}{:>12}{:>10.1f}{:>10.0%}{:>10}{:>10}".format(
+                plugin.meta_info.name, stats.queries, format_ms(stats.query_time.percentile(50)),
+                format_ms(stats.query_time.percentile(95)), format_ms(stats.async_time.percentile(95)),
+                stats.average_results(), stats.hit_rate(), stats.picks, stats.exceptions))
+        return "\n".join(lines)
+
+
+def format_ms(ms):
+    if ms is None:
+        return "-"
+    if ms == float("inf"):
+        return ">{:g}ms".format(BUCKETS[-1])
+    return "≤{:g}ms".format(ms)
+
+
+class StartupTimeline(object):
+    """
+    Spans (import and construct of every plugin, ...) and marks (window ready, first show) of the startup,
+    in ms since the timeline was created. Plugins loaded on demand later are recorded as well.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        # (start, end, phase, name, thread name)
+        self.spans = []
+        self.marks = {}
+
+    def now(self):
+        return (time.perf_counter() - self.origin) * 1000
+
+    @contextmanager
+    def span(self, phase, name):
+        start = self.now()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.spans.append((start, self.now(), phase, name, threading.current_thread().name))
+
+    def mark(self, name):
+        # only the first mark of a name counts, returns whether it's the first
+        with self.lock:
+            if name in self.marks:
+                return False
+            self.marks[name] = self.now()
+            return True
+
+    def slowest(self, count=3):
+        return sorted(self.spans, key=lambda span: span[0] - span[1])[:count]
+
+    def report(self):
+        with self.lock:
+            events = [(start, "{:>9.1f}ms {:>9.1f}ms  {:<10}{} [{}]".format(start, end - start, phase, name, thread))
+                      for start, end, phase, name, thread in self.spans]
+            events += [(at, "{:>9.1f}ms {:>11}  {:<10}".format(at, "", name)) for name, at in self.marks.items()]
+        return "\n".join(["{:>11} {:>11}  {:<10}".format("start", "duration", "phase")] +
+                         [line for _, line in sorted(events)])
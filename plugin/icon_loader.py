@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from plugin_api import get_logger
+
+log = get_logger("IconLoader")
+
+
+class IconLoader(QObject):
+    """
+    Loads the IconRequests of the painted rows on a few background threads, each key once.
+    sin_loaded(key) is emitted in the GUI thread when an icon arrived, so the rows showing it are repainted.
+    The loaded icons are kept by key, the least recently used ones are dropped after size of them.
+    """
+    sin_loaded = pyqtSignal(object)
+
+    def __init__(self, max_workers=4, size=1024):
+        super().__init__()
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="icon")
+        self.lock = threading.Lock()
+        self.icons = OrderedDict()
+        self.loading = set()
+
+    def get(self, request):
+        # -> the loaded icon of the request, None while it's loading, which is started when it isn't yet
+        with self.lock:
+            if request.key in self.icons:
+                self.icons.move_to_end(request.key)
+                return self.icons[request.key]
+            if request.key not in self.loading:
+                self.loading.add(request.key)
+                self.executor.submit(self.load, request)
+        return None
+
+    def load(self, request):
+        try:
+            icon = request.load()
+        except BaseException as e:
+            log.error("图标加载失败：{} {}".format(request.key, e))
+            icon = None
+        with self.lock:
+            self.loading.discard(request.key)
+            self.icons[request.key] = icon if icon is not None else request.placeholder
+            while len(self.icons) > self.size:
+                self.icons.popitem(last=False)
+        self.sin_loaded.emit(request.key)
+
+
+# shared by the result list and the plugins
+icon_loader = IconLoader()
@@ -0,0 +1,62 @@
+import os
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtGui import QIcon, QPixmap
+
+
+class PixmapCache(object):
+    """
+    Icons decoded and scaled once, keyed by (file path or QIcon.cacheKey(), width, height, device pixel ratio),
+    so painting a row doesn't read and rescale its icon again. Other pixmaps can be kept under their own keys
+    with lookup. The least recently used pixmaps are dropped once they take more than budget bytes.
+    Pixmaps belong to the GUI thread, so is the cache.
+    """
+
+    def __init__(self, budget=32 * 1024 * 1024):
+        self.budget = budget
+        self.size = 0
+        self.pixmaps = OrderedDict()
+
+    @staticmethod
+    def key(source, width, height, ratio):
+        source = source.cacheKey() if isinstance(source, QIcon) else os.path.abspath(source)
+        return source, width, height, ratio
+
+    def get(self, source, width, height, ratio=1.0):
+        # -> the pixmap of a file path or a QIcon, width and height in device independent pixels
+        return self.lookup(self.key(source, width, height, ratio), lambda: self.load(source, width, height, ratio))
+
+    @staticmethod
+    def load(source, width, height, ratio):
+        size = QSize(round(width * ratio), round(height * ratio))
+        pixmap = source.pixmap(size) if isinstance(source, QIcon) else QPixmap(source)
+        if not pixmap.isNull() and pixmap.size() != size:
+            pixmap = pixmap.scaled(size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        pixmap.setDevicePixelRatio(ratio)
+        return pixmap
+
+    def lookup(self, key, build):
+        # -> the pixmap cached under the key, build() makes it when it's missing
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+            return pixmap
+        pixmap = self.pixmaps[key] = build()
+        self.size += self.bytes(pixmap)
+        while self.size > self.budget and len(self.pixmaps) > 1:
+            _, dropped = self.pixmaps.popitem(last=False)
+            self.size -= self.bytes(dropped)
+        return pixmap
+
+    @staticmethod
+    def bytes(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def clear(self):
+        self.pixmaps.clear()
+        self.size = 0
+
+
+# shared by the result list and the plugins
+pixmap_cache = PixmapCache()
@@ -2,6 +2,8 @@ import json
 import os
 import logging
 import sys
+import threading
+import uuid
 from logging.handlers import TimedRotatingFileHandler
 from functools import wraps
 
@@ -25,27 +27,129 @@ class ContextApi:
         self.language = language
         self.size_scale = size_scale
         self.win_id=win_id
+        self.router = None
+        self.stats = None
+        # plugins may be loaded on demand, see plugin_loader
+        self.load_plugin = None
+        self.load_setting_plugins = None
+
+
+class CancelToken(str):
+    """
+    Token of a query. It equals the plain token string, so it can be emitted with the results as before,
+    and is cancelled by the dispatcher as soon as a newer query starts.
+    Plugins poll `cancelled` or register callbacks to abandon superseded work.
+    """
+
+    def __new__(cls, value=None):
+        token = super().__new__(cls, value or str(uuid.uuid1()))
+        token.lock = threading.Lock()
+        token.event = threading.Event()
+        token.callbacks = []
+        return token
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except BaseException as e:
+                get_logger("CancelToken").error(e)
+
+    def wait(self, timeout):
+        # sleep until the token is cancelled or the timeout passed, returns whether it was cancelled
+        return self.event.wait(timeout)
+
+    def add_callback(self, callback):
+        # the callback is called at once if the token has been cancelled
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+
+class Trigger(object):
+    """
+    When a global query is worth calling the plugin, checked by the router for all global plugins at once:
+        min_length: the least length of the text
+        pattern: regex the text matches from its start, without named groups and back references
+        require: characters the text contains one of, as inside [] of a regex
+        exclude: characters the text doesn't contain, as inside [] of a regex
+    """
+
+    def __init__(self, min_length=0, pattern=None, require=None, exclude=None):
+        self.min_length = min_length
+        self.pattern = pattern
+        self.require = require
+        self.exclude = exclude
+
+    def expression(self):
+        # the conditions as lookaheads at the start of the text, so the triggers of plugins can be combined
+        conditions = []
+        if self.min_length:
+            conditions.append(r"(?=[\s\S]{%d})" % self.min_length)
+        if self.require:
+            conditions.append(r"(?=[\s\S]*[%s])" % self.require)
+        if self.exclude:
+            conditions.append(r"(?![\s\S]*[%s])" % self.exclude)
+        if self.pattern:
+            conditions.append("(?=%s)" % self.pattern)
+        return "".join(conditions)
 
 
 class PluginInfo(object):
-    def __init__(self, name=None, desc=None, icon=None, keywords=None, async_result=False):
+    def __init__(self, name=None, desc=None, icon=None, keywords=None, async_result=False, deadline=None,
+                 refinable=False, cache_ttl=0, cache_size=64, isolated=False, trigger=None, weight=0):
         self.name = name
         self.icon = icon
         self.desc = desc
         self.keywords = keywords
         self.async_result = async_result
         self.path = None
+        # seconds the first paint waits for this plugin, None means the default of the main setting
+        self.deadline = deadline
+        # the results of a longer text are a subset of the results of its prefix, see AbstractPlugin.refine
+        self.refinable = refinable
+        # seconds the results of a (keyword, text) are reused, 0 disables the cache
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        # run the plugin in a worker process of the plugin host pool, see plugin_host
+        self.isolated = isolated
+        # global queries the plugin is called for, None means all of them
+        self.trigger = trigger
+        # added to the scores of the results when the results of all plugins are ranked, see ranker
+        self.weight = weight
 
 
 class AbstractPlugin(object):
     meta_info = PluginInfo()
 
     def query(self, keyword, text, token=None, parent_object=None):
+        # returns the results, or (results, QThread) if meta_info.async_result.
+        # It may also be an `async def` returning or yielding the results, run on the asyncio loop.
+        # The results may be a generator, its items are shown in batches while it's still yielding,
+        # or a ResultSource, whose first page is shown and the next ones as the list is scrolled.
+        # NO_CACHE among them keeps them out of the result cache (see PluginInfo.cache_ttl)
         pass
 
+    def refine(self, keyword, text, results):
+        # narrow the results of a prefix of the text, return None to query again
+        return None
+
 
 class SettingInterface(object):
     SETTING_FILE = "setting.json"
+    # called with the instance whenever a setting is reloaded
+    reload_hooks = []
 
     def __init__(self, edit=True):
         self.setting_path = os.path.join(self.meta_info.path, self.SETTING_FILE)
@@ -66,6 +170,8 @@ class SettingInterface(object):
 
     def reload(self):
         self.setting = None
+        for hook in SettingInterface.reload_hooks:
+            hook(self)
 
 
 class I18nInterface(object):
@@ -95,6 +201,7 @@ class SingleLogger(object):
     log = logging.getLogger("Beefalo")
     log.setLevel(logging.INFO)
     formatter = logging.Formatter("%(asctime)s - %(plugin_name)s - %(levelname)s - %(message)s")
+    os.makedirs("./log", exist_ok=True)
     log_file_handler = TimedRotatingFileHandler(filename="./log/Beefalo.log",
                                                 when="D", encoding="utf-8")
     log_file_handler.setFormatter(formatter)
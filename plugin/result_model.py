@@ -1,4 +1,5 @@
-from PyQt5.QtGui import QGuiApplication
+import threading
+
 from plugin_api import PluginInfo
 
 
@@ -10,9 +11,15 @@ class ResultAction:
         self.cost = False
 
 
+def copy_text(text):
+    # import Qt only when it's really used, so plugins can be loaded without it
+    from PyQt5.QtGui import QGuiApplication
+    QGuiApplication.clipboard().setText(text)
+
+
 class CopyAction(ResultAction):
     def __init__(self, text, close=True):
-        super().__init__(QGuiApplication.clipboard().setText, close, text)
+        super().__init__(copy_text, close, text)
 
 
 class MenuItem(object):
@@ -21,9 +28,28 @@ class MenuItem(object):
         self.action = action
 
 
+class IconRequest(object):
+    """
+    An icon that is slow to get, e.g. from the shell or the network, used as ResultItem.icon.
+    load() -> the icon (a QIcon or a path like ResultItem.icon) runs on the icon loader threads when the row is
+    first painted, the placeholder is painted until then. Requests with the same key are loaded once.
+    """
+
+    def __init__(self, key, load, placeholder=None):
+        self.key = key
+        self.load = load
+        self.placeholder = placeholder
+
+    def __eq__(self, other):
+        return isinstance(other, IconRequest) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
 class ResultItem:
     def __init__(self, plugin_info: PluginInfo, title=None, subTitle=None, icon=None, action=ResultAction(None, True),
-                 root=False):
+                 root=False, score=0):
         self.plugin_info = plugin_info
         self.icon = icon
         self.title = title
@@ -33,3 +59,44 @@ class ResultItem:
         self.expand = False
         self.root = root
         self.menus = []
+        # relevance of the result within its plugin, ranked with the results of the other plugins
+        self.score = score
+
+    def identity(self):
+        # the same result in different queries, to remember what the user picked
+        return "{}|{}|{}".format(self.plugin_info.path, self.title, self.subTitle)
+
+
+# put among the results of a query to keep them out of the result cache, e.g. when a part of the lookup failed
+NO_CACHE = object()
+
+
+class ResultSource(object):
+    """
+    Further results of a plugin, created a page at a time when the list is scrolled to its end instead of all at once.
+    A plugin returns it in place of its results, or puts it after the results it has already:
+        fetch(offset, count) -> about count results from offset on, fewer when there are no more.
+    fetch is called from worker threads, one call at a time. It may return a generator, the first page is
+    streamed then like the generator results of a query.
+    """
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.offset = 0
+        self.done = False
+        self.lock = threading.Lock()
+
+    def page(self, count):
+        # the next page as a generator, yielding the results as fetch produces them
+        with self.lock:
+            if self.done:
+                return
+            fetched = 0
+            for item in self.fetch(self.offset, count) or []:
+                self.offset += 1
+                fetched += 1
+                yield item
+            self.done = fetched < count
+
+    def more(self, count):
+        return list(self.page(count))
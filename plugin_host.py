@@ -0,0 +1,287 @@
+import importlib
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import copy
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+
+from plugin_api import I18nInterface, get_logger
+
+log = get_logger("插件进程")
+
+
+class HostError(Exception):
+    pass
+
+
+def serialize_item(item, actions, counter):
+    # -> dict of a ResultItem, its actions are kept in the worker and referred by id, except copying text
+    from result_model import CopyAction, IconRequest
+
+    def serialize_action(action):
+        if action is None or action.method is None:
+            return {"close": action.close if action else True}
+        if isinstance(action, CopyAction):
+            return {"close": action.close, "copy": action.args[0]}
+        action_id = next(counter)
+        actions[action_id] = action
+        while len(actions) > 1000:
+            actions.popitem(last=False)
+        return {"close": action.close, "id": action_id}
+
+    icon = item.icon.placeholder if isinstance(item.icon, IconRequest) else item.icon
+    return {"title": item.title, "subTitle": item.subTitle, "icon": icon, "root": item.root, "score": item.score,
+            "action": serialize_action(item.action),
+            "menus": [(menu.title, serialize_action(menu.action)) for menu in item.menus]}
+
+
+def host_main(conn, root):
+    # the loop of a worker process: load plugins, run their queries and actions, forward their api calls
+    os.chdir(root)
+    sys.path[:0] = [root, os.path.join(root, "plugin")]
+    from plugin_api import ContextApi
+
+    plugins, errors = {}, {}
+    actions, counter = OrderedDict(), itertools.count()
+
+    def api_call(key, name):
+        def call(*args):
+            if name in ("change_results", "change_selected_result"):
+                items = args[0] if name == "change_results" else [args[0]]
+                args = ([serialize_item(item, actions, counter) for item in items],) + args[1:]
+            conn.send(("api", key, name, args))
+
+        return call
+
+    def ignore(*args, **kwargs):
+        pass
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        kind = message[0]
+        if kind == "load":
+            key, path, class_name, language = message[1:]
+            try:
+                sys.path.append(path)
+                plugin_type = getattr(importlib.import_module(path.replace(os.sep, ".").replace("/", ".")),
+                                      class_name)
+                plugin_type.meta_info.path = path
+                api = ContextApi(api_call(key, "change_query"), api_call(key, "show_message"), ignore, [], dict,
+                                 api_call(key, "change_results"), api_call(key, "change_selected_result"),
+                                 api_call(key, "start_progress"), api_call(key, "end_progress"), ignore, [],
+                                 language, None, 0)
+                plugins[key] = plugin_type(api)
+            except BaseException as e:
+                errors[key] = "{}: {}".format(type(e).__name__, e)
+        elif kind == "query":
+            request_id, key, keyword, text = message[1:]
+            if key not in plugins:
+                conn.send(("error", request_id, errors.get(key, "not loaded")))
+                continue
+            try:
+                results = plugins[key].query(keyword, text) or []
+                conn.send(("results", request_id, [serialize_item(item, actions, counter) for item in results]))
+            except BaseException as e:
+                conn.send(("error", request_id, "{}: {}".format(type(e).__name__, e)))
+        elif kind == "action":
+            request_id, action_id = message[1:]
+            action = actions.get(action_id)
+            try:
+                if action:
+                    action.method(*action.args)
+                conn.send(("results", request_id, []))
+            except BaseException as e:
+                conn.send(("error", request_id, "{}: {}".format(type(e).__name__, e)))
+
+
+class PluginHost(object):
+    """
+    One worker process. It's started on the first request, and again after it crashed or was killed.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.lock = threading.Lock()
+        self.process = None
+        self.conn = None
+        self.loaded = set()
+        # request id -> (future, start time)
+        self.pending = {}
+
+    def start(self):
+        # requests of a killed process whose reader hasn't noticed it yet
+        pending, self.pending = self.pending, {}
+        for future, _ in pending.values():
+            future.set_exception(HostError("插件进程已退出"))
+        conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=host_main, args=(child_conn, self.pool.root), daemon=True,
+                                               name="plugin_host")
+        self.process.start()
+        child_conn.close()
+        self.conn = conn
+        self.loaded = set()
+        threading.Thread(target=self.read, args=(conn, self.process), daemon=True).start()
+
+    def request(self, plugin, message):
+        future = Future()
+        with self.lock:
+            if not self.process or not self.process.is_alive():
+                self.start()
+            if plugin.key not in self.loaded:
+                self.conn.send(("load", plugin.key, plugin.meta_info.path, plugin.class_name, plugin.api.language))
+                self.loaded.add(plugin.key)
+            request_id = next(self.pool.counter)
+            self.pending[request_id] = (future, time.monotonic())
+            self.conn.send((message[0], request_id) + message[1:])
+            future.host, future.process = self, self.process
+        return future
+
+    def read(self, conn, process):
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            if message[0] == "api":
+                self.pool.call_api(self, *message[1:])
+                continue
+            with self.lock:
+                future, _ = self.pending.pop(message[1], (None, None))
+            if not future:
+                continue
+            if message[0] == "results":
+                future.set_result(message[2])
+            else:
+                future.set_exception(HostError(message[2]))
+        # the process exited or was killed, fail its requests, the next one starts a new process
+        with self.lock:
+            pending = self.pending if self.process is process else {}
+            if self.process is process:
+                self.process, self.pending = None, {}
+        for future, _ in pending.values():
+            future.set_exception(HostError("插件进程已退出"))
+
+    def oldest(self):
+        with self.lock:
+            return min((start for _, start in self.pending.values()), default=None)
+
+    def kill(self):
+        with self.lock:
+            process = self.process
+        if process:
+            process.kill()
+
+    def busy(self):
+        return len(self.pending)
+
+
+class PluginHostPool(object):
+    """
+    Worker processes running the plugins flagged isolated in their PluginInfo. Their exceptions, GIL usage and
+    hangs stay out of the launcher: a worker stuck longer than the timeout is killed and restarted.
+    Results come back as plain data, and their actions are run by the worker that produced them.
+    The api calls of the plugins arrive on the reader threads of the pipes, invoke(call) runs them where the
+    api belongs, e.g. on the GUI thread.
+    """
+
+    def __init__(self, size=2, timeout=3, invoke=None):
+        self.root = os.path.dirname(os.path.abspath(__file__))
+        self.timeout = timeout
+        self.invoke = invoke or (lambda call: call())
+        self.hosts = [PluginHost(self) for _ in range(size)]
+        self.counter = itertools.count()
+        self.plugins = {}
+        self.closed = threading.Event()
+        self.watchdog = None
+        self.lock = threading.Lock()
+
+    def request(self, plugin, message):
+        with self.lock:
+            if not self.watchdog:
+                self.watchdog = threading.Thread(target=self.watch, name="plugin_host_watchdog", daemon=True)
+                self.watchdog.start()
+        self.plugins[plugin.key] = plugin
+        return min(self.hosts, key=PluginHost.busy).request(plugin, message)
+
+    def watch(self):
+        while not self.closed.wait(self.timeout / 4):
+            for host in self.hosts:
+                oldest = host.oldest()
+                if oldest and time.monotonic() - oldest > self.timeout:
+                    log.error("插件进程无响应，重启")
+                    host.kill()
+
+    def restore(self, plugin, host, process, data):
+        # a ResultItem in the launcher from its serialized form
+        from result_model import ResultItem, ResultAction, MenuItem, CopyAction
+
+        def restore_action(action):
+            if "copy" in action:
+                return CopyAction(action["copy"], action["close"])
+            if "id" in action:
+                return ResultAction(self.run_action, action["close"], plugin, host, process, action["id"])
+            return ResultAction(None, action["close"])
+
+        item = ResultItem(plugin.meta_info, data["title"], data["subTitle"], data["icon"],
+                          restore_action(data["action"]), data["root"], data["score"])
+        item.menus = [MenuItem(title, restore_action(action)) for title, action in data["menus"]]
+        return item
+
+    def run_action(self, plugin, host, process, action_id):
+        if host.process is not process:
+            log.error("插件进程已重启，操作失效：{}".format(plugin.meta_info.name))
+            return
+        host.request(plugin, ("action", action_id))
+
+    def call_api(self, host, key, name, args):
+        plugin = self.plugins.get(key)
+        if not plugin:
+            return
+        if name in ("change_results", "change_selected_result"):
+            items = [self.restore(plugin, host, host.process, data) for data in args[0]]
+            args = (items if name == "change_results" else items[0],) + args[1:]
+        self.invoke(lambda: getattr(plugin.api, name)(*args))
+
+    def shutdown(self):
+        self.closed.set()
+        for host in self.hosts:
+            host.kill()
+
+
+class IsolatedPlugin(I18nInterface):
+    """
+    Stands for a plugin running in the host pool. Refinement and settings stay with the plugin in its worker.
+    It's queried with the async_result contract, so the dispatcher passes the token and a superseded query
+    frees its worker thread instead of waiting for the process.
+    """
+
+    def __init__(self, plugin_type, pool: PluginHostPool, api):
+        self.meta_info = copy.copy(plugin_type.meta_info)
+        self.meta_info.async_result = True
+        self.class_name = plugin_type.__name__
+        self.key = "{}.{}".format(plugin_type.__module__, plugin_type.__name__)
+        self.pool = pool
+        self.api = api
+        if issubclass(plugin_type, I18nInterface):  # the name is translated by the constructor
+            I18nInterface.__init__(self, api.language)
+
+    def query(self, keyword, text, token=None, parent=None):
+        future = self.pool.request(self, ("query", self.key, keyword, text))
+        while True:
+            try:
+                results = future.result(0.05)
+                break
+            except TimeoutError:
+                if token and token.cancelled:
+                    return [], None
+        return [self.pool.restore(self, future.host, future.process, data) for data in results], None
+
+    def refine(self, keyword, text, results):
+        return None
@@ -0,0 +1,94 @@
+import json
+import os
+import threading
+
+from plugin_api import PluginInfo, I18nInterface, Trigger, get_logger
+
+log = get_logger("PluginLoader")
+
+
+class PluginManifest(object):
+    """
+    manifest.json of a plugin folder, read at startup instead of importing the plugin:
+        class: the plugin class exported by the package
+        name, desc, icon, keywords: shown and routed before the plugin is imported,
+            name and desc default to plugin_name and plugin_desc of i18n.json
+        global: whether the plugin takes the queries without keyword
+        trigger: the Trigger arguments of a global plugin, e.g. {"min_length": 2}, declared only here,
+            it's copied into the meta_info of the plugin class when that is imported
+        setting: whether the plugin has a setting to edit
+        eager: import at startup, for plugins working at startup or building their keywords at runtime
+        main_thread: construct it on the main thread, for eager plugins touching the GUI
+    """
+    FILE = "manifest.json"
+
+    def __init__(self, path, data, language):
+        self.path = path
+        self.class_name = data["class"]
+        self.eager = data.get("eager", False)
+        self.main_thread = data.get("main_thread", False)
+        self.setting = data.get("setting", False)
+        keywords = list(data.get("keywords", []))
+        if data.get("global"):
+            keywords.append("*")
+        self.meta_info = PluginInfo(data.get("name"), data.get("desc"), data.get("icon"), keywords)
+        self.meta_info.path = path
+        if data.get("trigger"):
+            self.meta_info.trigger = Trigger(**data["trigger"])
+        language_file = os.path.join(path, I18nInterface.LANGUAGE_FILE)
+        if not self.meta_info.name and os.path.exists(language_file):
+            with open(language_file, encoding="utf-8") as file:
+                all_language_data = json.load(file)
+            language_data = all_language_data.get(language) or next(iter(all_language_data.values()))
+            self.meta_info.name = language_data.get("plugin_name")
+            self.meta_info.desc = language_data.get("plugin_desc")
+
+    def apply(self, meta_info: PluginInfo):
+        # the manifest's trigger goes to the imported class, its keywords and icon must match the class
+        meta_info.trigger = self.meta_info.trigger
+        if not self.eager and set(meta_info.keywords or []) != set(self.meta_info.keywords):
+            log.warning("插件清单的关键字与插件不一致：{} {} {}".format(self.path, self.meta_info.keywords,
+                                                          meta_info.keywords))
+        if self.meta_info.icon and meta_info.icon != self.meta_info.icon:
+            log.warning("插件清单的图标与插件不一致：{} {} {}".format(self.path, self.meta_info.icon, meta_info.icon))
+
+    @staticmethod
+    def load(path, language):
+        manifest_file = os.path.join(path, PluginManifest.FILE)
+        if not os.path.exists(manifest_file):
+            return None
+        with open(manifest_file, encoding="utf-8") as file:
+            return PluginManifest(path, json.load(file), language)
+
+
+class LazyPlugin(object):
+    """
+    Stands for a plugin in the router until its keyword, or a global query, needs it the first time.
+    load(manifest) imports and constructs the plugin, it returns None if that failed.
+    """
+
+    def __init__(self, manifest: PluginManifest, load):
+        self.manifest = manifest
+        self.plugin = None
+        self.failed = False
+        self.lock = threading.Lock()
+        self.load_plugin = load
+
+    @property
+    def meta_info(self):
+        return self.plugin.meta_info if self.plugin else self.manifest.meta_info
+
+    def load(self):
+        with self.lock:
+            if not self.plugin and not self.failed:
+                self.plugin = self.load_plugin(self.manifest)
+                self.failed = self.plugin is None
+        return self.plugin
+
+    def query(self, *args):
+        # the dispatcher loads the plugin before, so it calls the query as the plugin's meta_info tells
+        plugin = self.load()
+        return plugin.query(*args) if plugin else []
+
+    def refine(self, keyword, text, results):
+        return self.plugin.refine(keyword, text, results) if self.plugin else None
@@ -60,12 +60,15 @@ class AsyncSuggestThread(QThread):
         self.config = config
 
     def run(self):
+        if self.token.cancelled:
+            return
         cache[self.config.key] = get_sections(self.config)
-        self.sin_out.emit(self.token, build_result(self.plugin_info, self.config, self.text))
+        if not self.token.cancelled:
+            self.sin_out.emit(self.token, build_result(self.plugin_info, self.config, self.text))
 
 
 class APIDocPlugin(AbstractPlugin, SettingInterface, I18nInterface):
-    meta_info = PluginInfo(icon="images/API_icon.png", keywords=[], async_result=True)
+    meta_info = PluginInfo(icon="images/API_icon.png", keywords=[], async_result=True, refinable=True)
 
     def __init__(self, api: ContextApi):
         SettingInterface.__init__(self)
@@ -80,6 +83,10 @@ class APIDocPlugin(AbstractPlugin, SettingInterface, I18nInterface):
         else:
             return [], AsyncSuggestThread(self.meta_info, parent, self.configs[keyword], text, token)
 
+    def refine(self, keyword, text, results):
+        text = text.strip().lower()
+        return [item for item in results if text in item.title.lower()]
+
     def load_docs(self):
         documents = self.get_setting("documents")
         keys = []
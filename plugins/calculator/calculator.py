@@ -6,7 +6,8 @@ import numbers
 
 
 class CalculatorPlugin(AbstractPlugin, I18nInterface):
-    meta_info = PluginInfo(icon="images/calculator_icon5.png", keywords=["*"], async_result=False)
+    meta_info = PluginInfo(icon="images/calculator_icon5.png", keywords=["*"], async_result=False,
+                           isolated=True, weight=1)
 
     def __init__(self, api: ContextApi):
         I18nInterface.__init__(self, api.language)
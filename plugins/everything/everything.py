@@ -1,5 +1,6 @@
 import os
 import ctypes
+import threading
 from ctypes.wintypes import *
 import platform
 import subprocess
@@ -12,12 +13,12 @@ import win32gui
 import win32ui
 
 from PyQt5 import QtCore
-from PyQt5.QtCore import QThread, pyqtSignal, QFileInfo
+from PyQt5.QtCore import QFileInfo
 from PyQt5.QtGui import QIcon, QGuiApplication
 from PyQt5.QtWidgets import QFileIconProvider
 from PyQt5.QtWinExtras import QtWin
 
-from result_model import ResultItem, ResultAction, MenuItem, CopyAction
+from result_model import ResultItem, ResultAction, MenuItem, CopyAction, ResultSource, IconRequest
 from plugin_api import AbstractPlugin, PluginInfo, SettingInterface, ContextApi, get_logger, I18nInterface
 from file_icon import file_icons
 
@@ -77,6 +78,19 @@ def get_link_target(link_file):
     return QIcon(QtWin.fromHBITMAP(hbmp.GetHandle(), 2))
 
 
+def load_link_icon(link_file):
+    pythoncom.CoInitialize()  # wscript.shell, on an icon loader thread
+    return get_link_target(link_file)
+
+
+def load_file_icon(file):
+    return QFileIconProvider().icon(QFileInfo(file))
+
+
+# files whose system icon is their own, the others share the icon of their extension
+OWN_ICON_EXTENSIONS = {"exe", "ico", "lnk", "msc", "cpl", "scr"}
+
+
 class FileResultItem(ResultItem):
     def __init__(self, plugin_info, i18n: I18nInterface, fileName: str, fullPath, isDir, api: ContextApi,
                  system_icon=False):
@@ -87,26 +101,24 @@ class FileResultItem(ResultItem):
             self.title = fileName
         self.subTitle = fullPath
 
+        doti = fileName.rfind(".")
+        ext = str(fileName[doti + 1:]) if doti > -1 and not isDir else ""
+        if isDir:
+            self.icon = file_icons["folder"]
+        else:
+            self.icon = file_icons.get(ext) or file_icons["*"]
+        self.icon = os.path.join("images", "icons", self.icon + ".svg")
         if system_icon:
-            if fileName.endswith(".url"):
+            ext = ext.lower()
+            # the system icons are loaded in the background, the icon of the file type is painted until then
+            if ext == "url":
                 self.icon = os.path.join("images", "link.png")
+            elif ext == "lnk":
+                self.icon = IconRequest(fullPath, lambda: load_link_icon(fullPath), self.icon)
+            elif isDir or ext in OWN_ICON_EXTENSIONS or not ext:
+                self.icon = IconRequest(fullPath, lambda: load_file_icon(fullPath), self.icon)
             else:
-                icon_file_path = fullPath
-                if fileName.endswith(".lnk"):
-                    self.icon = get_link_target(fullPath)
-                else:
-                    self.icon = QFileIconProvider().icon(QFileInfo(icon_file_path))
-        else:
-            if isDir:
-                self.icon = file_icons["folder"]
-            else:
-                self.icon = file_icons["*"]
-                doti = fileName.rfind(".")
-                if doti > -1:
-                    ext = str(fileName[doti + 1:])
-                    if file_icons.get(ext):
-                        self.icon = file_icons[ext]
-            self.icon = os.path.join("images", "icons", self.icon + ".svg")
+                self.icon = IconRequest("." + ext, lambda: load_file_icon(fullPath), self.icon)
         self.action = ResultAction(open_file, True, self.subTitle, plugin_info, api)
         self.menus = []
         if isDir:
@@ -119,63 +131,41 @@ class FileResultItem(ResultItem):
             MenuItem(" " + i18n.i18n_text("copy_file"), ResultAction(copy_file, True, self.subTitle))]
 
 
-class AsyncSearchThread(QThread):
-    sin_out = pyqtSignal([str, list])
-
-    def __init__(self, parent, text, token, api, plugin_info, i18n, query_max=50, system_icon=False, root=None):
-        pythoncom.CoInitialize()
-        super(AsyncSearchThread, self).__init__(parent)
-        self.text = text
-        self.token = token
-        self.api = api
-        self.plugin_info = plugin_info
-        self.query_max = query_max
-        self.system_icon = system_icon
-        self.root = root
-        self.i18n = i18n
-
-    @staticmethod
-    def getFileName(path: str):
-        return path.split("\\")[-1]
-
-    def run(self):
-        try:
-            results = everything_query(self.root, self.text, self.query_max, self.plugin_info, self.i18n, self.api,
-                                       self.system_icon)
-            self.sin_out.emit(self.token, results)
-        except BaseException as e:
-            log.error(e)
+def get_file_name(path: str):
+    return path.split("\\")[-1]
 
 
 global everything_dll
-
-
-def everything_query(root, text, query_max, plugin_info, i18n, api, system_icon):
-    if root:
-        root_path = "|".join(["<{}>".format(path) for path in root])
-        everything_dll.Everything_SetSearchW(root_path + " " + text)
-    else:
-        everything_dll.Everything_SetSearchW(text)
-    if query_max:
-        everything_dll.Everything_SetMax(query_max)
-    everything_dll.Everything_QueryW(True)
-    # everything_dll.Everything_SetMatchPath(True)
-    # everything_dll.Everything_SetRegex(True)
-    num_results = everything_dll.Everything_GetNumResults()
-    fullPath = ctypes.create_unicode_buffer(500)
-    results = []
-    for i in range(num_results):
-        everything_dll.Everything_GetResultFullPathNameW(i, fullPath, 490)
-        path = ctypes.wstring_at(fullPath)
-        if system_icon:
-            results.append(
-                FileResultItem(plugin_info, i18n, AsyncSearchThread.getFileName(path), path, os.path.isdir(path),
-                               api, True))
+# the search state of the dll is global, queries from different threads must not interleave
+everything_lock = threading.Lock()
+
+
+def everything_query(root, text, query_max, plugin_info, i18n, api, system_icon, token=None, offset=0):
+    # a generator of the FileResultItems from the offset-th one on, at most query_max of them
+    with everything_lock:
+        if token is not None and token.cancelled:
+            return
+        if root:
+            root_path = "|".join(["<{}>".format(path) for path in root])
+            everything_dll.Everything_SetSearchW(root_path + " " + text)
         else:
-            results.append(
-                FileResultItem(plugin_info, i18n, AsyncSearchThread.getFileName(path), path, os.path.isdir(path),
-                               api))
-    return results
+            everything_dll.Everything_SetSearchW(text)
+        if query_max:
+            everything_dll.Everything_SetMax(query_max)
+        everything_dll.Everything_SetOffset(offset)
+        everything_dll.Everything_QueryW(True)
+        # everything_dll.Everything_SetMatchPath(True)
+        # everything_dll.Everything_SetRegex(True)
+        num_results = everything_dll.Everything_GetNumResults()
+        fullPath = ctypes.create_unicode_buffer(500)
+        paths = []
+        for i in range(num_results):
+            everything_dll.Everything_GetResultFullPathNameW(i, fullPath, 490)
+            paths.append(ctypes.wstring_at(fullPath))
+    for path in paths:
+        if token is not None and token.cancelled:
+            return
+        yield FileResultItem(plugin_info, i18n, get_file_name(path), path, os.path.isdir(path), api, system_icon)
 
 
 class EverythingPlugin(AbstractPlugin, SettingInterface, I18nInterface):
@@ -198,13 +188,19 @@ class EverythingPlugin(AbstractPlugin, SettingInterface, I18nInterface):
     def query(self, keyword, text, token=None, parent=None):
         pythoncom.CoInitialize()  # wscript.shell
         if text.strip():
-            if keyword and keyword != "*":
-                return [], AsyncSearchThread(parent, text, token, self.api, self.meta_info, self,
-                                             self.get_setting("everything_query_max"),
-                                             self.get_setting("system_icon"))
-            else:
-                return everything_query(self.get_setting("link_root"), text, self.get_setting("everything_query_max"),
-                                        self.meta_info, self, self.api, self.get_setting("system_icon")), None
+            root = None if keyword and keyword != "*" else self.get_setting("link_root")
+            query_max = self.get_setting("everything_query_max")
+
+            def fetch(offset, count):
+                # a page of the results, the next ones are searched when the list is scrolled to its end
+                if query_max:
+                    count = min(count, query_max - offset)
+                if count <= 0:
+                    return []
+                return everything_query(root, text, count, self.meta_info, self, self.api,
+                                        self.get_setting("system_icon"), token, offset)
+
+            return ResultSource(fetch), None
         else:
             results = []
             recent_dir = os.path.join(str(Path.home()), "AppData/Roaming/Microsoft/Windows/Recent")
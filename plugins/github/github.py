@@ -9,11 +9,14 @@ from bs4 import BeautifulSoup
 from functools import lru_cache
 
 from plugin_api import PluginInfo, ContextApi, SettingInterface, AbstractPlugin, get_logger
-from result_model import ResultItem, ResultAction, MenuItem
+from result_model import ResultItem, ResultAction, MenuItem, ResultSource
 
 log = get_logger("GitHub")
 
 global proxy
+# roots of the requested urls, replaced by local servers when benchmarking
+api_root = "https://api.github.com"
+web_root = "https://github.com"
 
 
 @lru_cache(maxsize=256)
@@ -109,7 +112,7 @@ class EventItem(ResultItem):
 
 
 class GitHubPlugin(AbstractPlugin, SettingInterface):
-    meta_info = PluginInfo("GitHub", "GitHub tools", "images/github_icon.png", ["ghb"], False)
+    meta_info = PluginInfo("GitHub", "GitHub tools", "images/github_icon.png", ["ghb"], False, cache_ttl=300)
 
     def __init__(self, api: ContextApi):
         SettingInterface.__init__(self)
@@ -165,19 +168,23 @@ class GitHubPlugin(AbstractPlugin, SettingInterface):
             return [home, feeds, events, repositories, trending]
 
     def search_repository(self, name):
-        url = "https://api.github.com/search/repositories"
+        url = api_root + "/search/repositories"
+
+        def fetch(offset, count):
+            # the api pages by 30 repositories, the next page is requested when the list is scrolled to its end
+            resp = requests.get(url, {"q": name, "page": offset // 30 + 1}, proxies=self.proxy)
+            if resp.status_code != 200:
+                return []
+            return [RepositoryItem(self.meta_info, repo) for repo in json.loads(resp.text)["items"]]
+
         try:
-            repos = []
-            for p in range(1):
-                resp = requests.get(url, {"q": name, "page": p + 1}, proxies=self.proxy)
-                if resp.status_code == 200:
-                    repos += json.loads(resp.text)["items"]
-            results = []
-            for repo in repos:
-                results.append(RepositoryItem(self.meta_info, repo))
+            source = ResultSource(fetch)
+            results = source.more(30)
             results.append(ResultItem(self.meta_info, "Search \"{}\" in GitHub website".format(name), name,
                                       "images/github_icon.png",
                                       ResultAction(webbrowser.open, True, "https://github.com/search?q=" + name)))
+            if not source.done:
+                results.append(source)
             self.api.change_results(results)
         except BaseException as e:
             log.error(e)
@@ -186,7 +193,7 @@ class GitHubPlugin(AbstractPlugin, SettingInterface):
         icons = {"Issue": "images/github_comment.png",
                  "RepositoryVulnerabilityAlert": "images/github_alert.png",
                  "PullRequest": "images/github_pull.png"}
-        url = "https://api.github.com/notifications?all=true"
+        url = api_root + "/notifications?all=true"
         try:
             resp = requests.get(url, headers={"Authorization": "token " + self.user_token}, proxies=self.proxy)
             if resp.status_code == 200:
@@ -208,7 +215,7 @@ class GitHubPlugin(AbstractPlugin, SettingInterface):
         return []
 
     def my_activity(self):
-        url = "https://api.github.com/users/{}/received_events".format(self.user_name)
+        url = api_root + "/users/{}/received_events".format(self.user_name)
         try:
             events = []
             resp = requests.get(url, headers={"Authorization": "token " + self.user_token}, proxies=self.proxy)
@@ -223,7 +230,7 @@ class GitHubPlugin(AbstractPlugin, SettingInterface):
         return []
 
     def my_repositories(self):
-        url = "https://api.github.com/user/repos"
+        url = api_root + "/user/repos"
         try:
             repos = []
             resp = requests.get(url, headers={"Authorization": "token " + self.user_token}, proxies=self.proxy)
@@ -238,7 +245,7 @@ class GitHubPlugin(AbstractPlugin, SettingInterface):
         return []
 
     def github_trending(self):
-        url = "https://github.com/trending"
+        url = web_root + "/trending"
         try:
             repos = []
             resp = requests.get(url, proxies=self.proxy)
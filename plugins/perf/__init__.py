@@ -0,0 +1 @@
+from perf import PerfPlugin
\ No newline at end of file
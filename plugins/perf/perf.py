@@ -0,0 +1,56 @@
+import os
+from plugin_api import AbstractPlugin, ContextApi, PluginInfo, I18nInterface
+from result_model import ResultItem, ResultAction, MenuItem, CopyAction
+from perf_stats import format_ms
+
+
+class PerfPlugin(AbstractPlugin, I18nInterface):
+    meta_info = PluginInfo(icon="images/perf_icon.png", keywords=["perf"], async_result=False)
+
+    def __init__(self, api: ContextApi):
+        I18nInterface.__init__(self, api.language)
+        self.api = api
+
+    def reset(self, to_query):
+        self.api.stats.reset()
+        self.api.change_query(to_query)
+
+    def get_menus(self, to_query, report):
+        return [MenuItem(" {}".format(self.i18n_text("reset")), ResultAction(self.reset, False, to_query)),
+                MenuItem(" {}".format(self.i18n_text("copy_report")), CopyAction(report))]
+
+    def get_startup_item(self, timeline):
+        ready = timeline.marks.get("first show", timeline.marks.get("window"))
+        title = self.i18n_text("startup").format(ready if ready is not None else timeline.now())
+        subTitle = "  •  ".join("{} {} {:.0f}ms".format(phase, name, end - start)
+                                for start, end, phase, name, _ in timeline.slowest())
+        return ResultItem(self.meta_info, title, subTitle, self.meta_info.icon, CopyAction(timeline.report()))
+
+    def query(self, keyword, text, token=None, parent=None):
+        to_query = "{} {}".format(keyword, text)
+        # built once, every row copies the same report
+        report = self.api.stats.report()
+        results = []
+        if not text.strip() and self.api.stats.timeline:
+            results.append(self.get_startup_item(self.api.stats.timeline))
+        for plugin, stats in self.api.stats.ranking():
+            if text.strip().lower() not in plugin.meta_info.name.lower():
+                continue
+            query_time = stats.query_time
+            subTitle = self.i18n_text("stats").format(format_ms(query_time.percentile(50)),
+                                                      format_ms(query_time.percentile(95)),
+                                                      format_ms(query_time.percentile(99)),
+                                                      format_ms(stats.async_time.percentile(95)), stats.queries,
+                                                      stats.average_results(), stats.hit_rate(),
+                                                      stats.picks, stats.exceptions)
+            item = ResultItem(self.meta_info, plugin.meta_info.name, subTitle,
+                              os.path.join(plugin.meta_info.path, plugin.meta_info.icon),
+                              CopyAction(report), True)
+            item.menus = self.get_menus(to_query, report)
+            results.append(item)
+        if not self.api.stats.plugins:
+            item = ResultItem(self.meta_info, self.i18n_text("no_stats"), self.meta_info.desc,
+                              self.meta_info.icon, ResultAction(None, False))
+            item.menus = self.get_menus(to_query, report)
+            results.append(item)
+        return results
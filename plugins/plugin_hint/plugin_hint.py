@@ -1,4 +1,3 @@
-import inspect
 import os
 import re
 from plugin_api import AbstractPlugin, ContextApi, PluginInfo, SettingInterface, I18nInterface
@@ -10,35 +9,46 @@ def convertJsTemplate(text):
 
 
 class PluginHintPlugin(AbstractPlugin, I18nInterface):
-    meta_info = PluginInfo(icon="images/plugin_hint_icon.png", keywords=["pl", "*"], async_result=False)
+    meta_info = PluginInfo(icon="images/plugin_hint_icon.png", keywords=["pl", "*"], async_result=False,
+                           refinable=True)
 
     def __init__(self, api: ContextApi):
         I18nInterface.__init__(self, api.language)
         self.api = api
 
-    def getPluginItem(self, plugin: AbstractPlugin, key):
+    def getPluginItem(self, plugin, key):
+        # the plugin may not be loaded yet, its meta info comes from the manifest then
         action = ResultAction(self.api.change_query, False, key)
         subTitle = "{}    {}".format(plugin.meta_info.desc, " • ".join(plugin.meta_info.keywords))
         item = ResultItem(self.meta_info, plugin.meta_info.name, subTitle,
                           os.path.join(plugin.meta_info.path, plugin.meta_info.icon),
                           action, True)
         item.menus = [MenuItem(" {}".format(self.i18n_text("open_dir")), ResultAction(os.startfile, True, plugin.meta_info.path))]
-        if SettingInterface in inspect.getmro(plugin):
-            item.menus.append(MenuItem(" {}".format(self.i18n_text("setting")), ResultAction(self.api.edit_setting, True, plugin)))
+        manifest = getattr(plugin, "manifest", None)
+        if manifest.setting if manifest else isinstance(plugin, SettingInterface):
+            item.menus.append(MenuItem(" {}".format(self.i18n_text("setting")), ResultAction(self.edit_setting, True, plugin)))
         return item
 
+    def edit_setting(self, plugin):
+        plugin = self.api.load_plugin(plugin)
+        if plugin:
+            self.api.edit_setting(type(plugin))
+
     def query(self, keyword, text, token=None, parent=None):
         results = []
         if keyword and keyword != "*":
-            for plugin in self.api.plugin_types:
+            for plugin in self.api.router.plugins:
                 key = ""
                 if plugin.meta_info.keywords and plugin.meta_info.keywords[0] != "*":
                     key = plugin.meta_info.keywords[0] + " "
                 results.append(self.getPluginItem(plugin, key))
         else:
-            for plugin in self.api.plugin_types:
-                for key in plugin.meta_info.keywords:
-                    if key.startswith(text) and key != text:
-                        results.append(self.getPluginItem(plugin, key + " "))
-                        break
+            for key, plugin in self.api.router.complete(text):
+                results.append(self.getPluginItem(plugin, key + " "))
         return results
+
+    def refine(self, keyword, text, results):
+        if keyword and keyword != "*":  # all plugins are listed whatever the text is
+            return results
+        # the first matched keyword of a plugin may change as the text grows
+        return None
@@ -4,11 +4,12 @@ import os
 
 from PyQt5 import QtGui, QtCore, Qsci
 from PyQt5.QtCore import QSize, QModelIndex, Qt
-from PyQt5.QtGui import QIcon, QFont, QGuiApplication, QPixmap, QCursor,QKeySequence
+from PyQt5.QtGui import QIcon, QFont, QGuiApplication, QCursor,QKeySequence
 from PyQt5.QtWidgets import QDialog, QTextEdit, QVBoxLayout, QDesktopWidget, QHBoxLayout, QListWidget, QListWidgetItem, \
     QWidget, QLabel, QGroupBox, QPushButton, QSpacerItem, QSizePolicy, QPlainTextEdit, QApplication,QShortcut
 from plugin_api import AbstractPlugin, ContextApi, PluginInfo, SettingInterface, get_logger
 from result_model import ResultItem, ResultAction, MenuItem
+from pixmap_cache import pixmap_cache
 
 log = get_logger("Setting")
 
@@ -102,9 +103,8 @@ class PluginTitleWidget(QWidget):
         hly.setContentsMargins(0, 0, 0, 0)
 
         self.icon_label = QLabel()
-        pm = QPixmap(os.path.join(plugin.meta_info.path, plugin.meta_info.icon))
-        pm = pm.scaled(32, 32, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-        self.icon_label.setPixmap(pm)
+        self.icon_label.setPixmap(pixmap_cache.get(os.path.join(plugin.meta_info.path, plugin.meta_info.icon), 32, 32,
+                                                   self.devicePixelRatioF()))
 
         self.name_label = QLabel(plugin.meta_info.name)
         font = QFont()
@@ -122,10 +122,9 @@ class PluginTitleWidget(QWidget):
         self.setCursor(QCursor(Qt.PointingHandCursor))
 
     def change_size(self):
-        pm = QPixmap(os.path.join(self.plugin.meta_info.path, self.plugin.meta_info.icon))
-        pm = pm.scaled(32 * self.api.size_scale.g, 32 * self.api.size_scale.g, Qt.IgnoreAspectRatio,
-                       Qt.SmoothTransformation)
-        self.icon_label.setPixmap(pm)
+        size = round(32 * self.api.size_scale.g)
+        self.icon_label.setPixmap(pixmap_cache.get(os.path.join(self.plugin.meta_info.path, self.plugin.meta_info.icon),
+                                                   size, size, self.devicePixelRatioF()))
         font = self.name_label.font()
         font.setPixelSize(16 * self.api.size_scale.f)
         self.name_label.setFont(font)
@@ -200,6 +199,8 @@ class SettingDialog(QWidget):
         hly.addWidget(self.editor_list)
         hly.setSpacing(0)
 
+        if self.api.load_setting_plugins:  # plugins with a setting may not be loaded yet
+            self.api.load_setting_plugins()
         for plugin in self.api.setting_plugins:
             plugin_title_item = QListWidgetItem()
             plugin_title_widget = PluginTitleWidget(plugin, self.api)
@@ -14,7 +14,7 @@ class Theme(object):
 
 
 class ThemePlugin(AbstractPlugin, SettingInterface, I18nInterface):
-    meta_info = PluginInfo(icon="images/theme_icon.png", keywords=["theme"], async_result=False)
+    meta_info = PluginInfo(icon="images/theme_icon.png", keywords=["theme"], async_result=False, refinable=True)
 
     def __init__(self, api: ContextApi):
         SettingInterface.__init__(self, False)
@@ -46,6 +46,9 @@ class ThemePlugin(AbstractPlugin, SettingInterface, I18nInterface):
                     ResultItem(self.meta_info, theme, self.themes[theme].file, "images/theme_icon.png", action))
         return results
 
+    def refine(self, keyword, text, results):
+        return [item for item in results if text.lower() in item.title.lower()]
+
     def change_theme(self, theme):
         css = self.theme_template.format(c=theme.style["color"],
                                          mb=theme.style["background"],
@@ -3,7 +3,6 @@ import os
 import uuid
 from datetime import datetime
 
-from PyQt5.QtGui import QGuiApplication
 from plugin_api import PluginInfo, ContextApi, AbstractPlugin, get_logger, I18nInterface
 from result_model import ResultItem, ResultAction, MenuItem, CopyAction
 
@@ -19,7 +18,7 @@ class Todo(object):
 
 
 class TodoPlugin(AbstractPlugin, I18nInterface):
-    meta_info = PluginInfo(icon="images/todo_icon1.png", keywords=["todo"])
+    meta_info = PluginInfo(icon="images/todo_icon1.png", keywords=["todo"], refinable=True)
     todo_file = "todo.md"
 
     def __init__(self, api: ContextApi):
@@ -31,6 +30,7 @@ class TodoPlugin(AbstractPlugin, I18nInterface):
         icon = "images/o-c.png" if todo.check else "images/c.png"
         action = ResultAction(self.change_status, False, todo.id, to_query)
         item = ResultItem(self.meta_info, todo.text, todo.time, icon, action)
+        item.todo = todo
         item.menus = [
             MenuItem(" " + self.i18n_text("copy"), CopyAction(todo.text)),
             MenuItem(" " + self.i18n_text("delete"),
@@ -83,7 +83,13 @@ class TodoPlugin(AbstractPlugin, I18nInterface):
         self.api.change_query(to_query)
 
     def query(self, keyword, text, token=None, parent=None):
-        todos = self.load_items(text)
+        return self.convert_results(self.load_items(text), keyword, text)
+
+    def refine(self, keyword, text, results):
+        todos = [item.todo for item in results if hasattr(item, "todo") and text.strip() in item.todo.text]
+        return self.convert_results(todos, keyword, text)
+
+    def convert_results(self, todos, keyword, text):
         results = []
         for todo in todos:
             to_query = "{} {}".format(keyword, text)
@@ -1,14 +1,15 @@
-import re, json
+import re
 import os
+import asyncio
 import requests
 import uuid
 from hashlib import sha256
 from datetime import datetime
-from PyQt5.QtCore import QThread, pyqtSignal, QUrl
+from PyQt5.QtCore import QUrl
 from PyQt5.QtMultimedia import QSound, QMediaPlayer, QMediaContent
 
 from plugin_api import PluginInfo, ContextApi, AbstractPlugin, get_logger
-from result_model import ResultItem, ResultAction, MenuItem
+from result_model import ResultItem, ResultAction, MenuItem, NO_CACHE
 
 log = get_logger("在线词典")
 
@@ -37,66 +38,27 @@ def play_sound(plugin_info, api, url):
     # api.play_media(QUrl(url))
 
 
-class YoudaoApiThread(QThread):
-    sin_out = pyqtSignal([str, list])
+api_url = "https://open" + "api.you" + "dao.com/api"
 
-    def __init__(self, plugin_info, parent, api, text, token):
-        super(YoudaoApiThread, self).__init__(parent)
-        self.parent = parent
-        self.text = text
-        self.token = token
-        self.plugin_info = plugin_info
-        self.api = api
-
-    def run(self):
-        t = int((datetime.utcnow() - datetime(1970, 1, 1)).total_seconds())
-        salt = str(uuid.uuid1())
-        sec = "l75XR7v" + "6A5pFI" + "e59EZ7f" + "cfJtiOW" + "x82SS"
-        params = {"q": self.text, "from": "auto", "to": "auto",
-                  "app" + "Key": "2e633" + "5573f80" + "2c90",
-                  "salt": salt, "sign" + "Type": "v3", "curtime": str(t)}
-
-        shaHash = sha256()
-        shaHash.update((params["app" + "Key"] + params["q"] + params["salt"] + params["curtime"] + sec).encode(
-            'utf-8'))
-        params["si" + "gn"] = shaHash.hexdigest()
-
-        try:
-            results = []
-            resp = requests.get("https://open" + "api.you" + "dao.com/api", params)
-            apiResp = json.loads(resp.text)
-            if apiResp.get("basic"):
-                if apiResp["basic"].get("us-phonetic"):
-                    phonetic, wfs = "美[{}]  英[{}]".format(apiResp["basic"].get("us-phonetic"),
-                                                          apiResp["basic"].get("uk-phonetic")), ""
-                    item = DictResultItem(self.plugin_info, wfs, phonetic, "basic")
-                    if apiResp["basic"].get("wfs"):
-                        for wf in apiResp["basic"]["wfs"]:
-                            wfs += "{}：{}；".format(wf["wf"]["name"], wf["wf"]["value"])
-                        item.title, item.subTitle = wfs, phonetic
-                    else:
-                        item.title, item.subTitle = phonetic, None
 
-                    item.action = ResultAction(play_sound, False, self.plugin_info, self.api, apiResp.get("speakUrl"))
-                    results.append(item)
+def sign_params(text):
+    t = int((datetime.utcnow() - datetime(1970, 1, 1)).total_seconds())
+    salt = str(uuid.uuid1())
+    sec = "l75XR7v" + "6A5pFI" + "e59EZ7f" + "cfJtiOW" + "x82SS"
+    params = {"q": text, "from": "auto", "to": "auto",
+              "app" + "Key": "2e633" + "5573f80" + "2c90",
+              "salt": salt, "sign" + "Type": "v3", "curtime": str(t)}
 
-                if apiResp["basic"].get("explains"):
-                    for exp in apiResp["basic"]["explains"]:
-                        item=DictResultItem(self.plugin_info, exp, self.text, "translate")
-                        item.menus=[MenuItem(" 加入到生词本",ResultAction(self.add_word,True,self.text,exp))]
-                        results.append(item)
-            self.sin_out.emit(self.token, results)
-        except BaseException as e:
-            log.error(e)
-    
-    def add_word(self,word,exp):
-        with open(os.path.join(self.plugin_info.path,TranslatePlugin.word_file),"a",encoding="utf-8") as word_file:
-            word_file.write("{}\t{}\n".format(word,exp))
+    shaHash = sha256()
+    shaHash.update((params["app" + "Key"] + params["q"] + params["salt"] + params["curtime"] + sec).encode(
+        'utf-8'))
+    params["si" + "gn"] = shaHash.hexdigest()
+    return params
 
 
 class TranslatePlugin(AbstractPlugin):
     meta_info = PluginInfo("在线词典", "使用有道云接口的在线典", "images/dict_basic.png",
-                           ["dict"], True)
+                           ["dict"], False, cache_ttl=3600, cache_size=256)
     word_file="word.txt"
 
     def __init__(self, api: ContextApi):
@@ -138,12 +100,50 @@ class TranslatePlugin(AbstractPlugin):
                     word_file.write(l)
         self.show_word(True)
 
-    def query(self, keyword, text, token=None, parent=None):
-        if len(text.strip()):
-            results = []
-            if self.localDict.get(text):
-                for translation in self.localDict[text]:
-                    results.append(DictResultItem(self.meta_info, translation, text, "translate"))
-            return results, YoudaoApiThread(self.meta_info, parent, self.api, text, token)
-        else:
-            return [ResultItem(self.meta_info,title="查看生词本",icon="images/dict_basic.png",action=ResultAction(self.show_word,False))], None
+    def add_word(self,word,exp):
+        with open(os.path.join(self.meta_info.path,self.word_file),"a",encoding="utf-8") as word_file:
+            word_file.write("{}\t{}\n".format(word,exp))
+
+    async def query(self, keyword, text, token=None, parent=None):
+        if not len(text.strip()):
+            yield ResultItem(self.meta_info,title="查看生词本",icon="images/dict_basic.png",action=ResultAction(self.show_word,False))
+            return
+        # the local translations are shown while the api is asked
+        if self.localDict.get(text):
+            for translation in self.localDict[text]:
+                yield DictResultItem(self.meta_info, translation, text, "translate")
+        try:
+            resp = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: requests.get(api_url, sign_params(text), timeout=10))
+            apiResp = resp.json()
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            log.error(e)
+            apiResp = None
+        if not apiResp or apiResp.get("errorCode", "0") != "0":
+            if apiResp:
+                log.error("有道接口错误：{}".format(apiResp.get("errorCode")))
+            # the failed lookup isn't cached as the translation of the text
+            yield NO_CACHE
+            return
+        if apiResp.get("basic"):
+            if apiResp["basic"].get("us-phonetic"):
+                phonetic, wfs = "美[{}]  英[{}]".format(apiResp["basic"].get("us-phonetic"),
+                                                      apiResp["basic"].get("uk-phonetic")), ""
+                item = DictResultItem(self.meta_info, wfs, phonetic, "basic")
+                if apiResp["basic"].get("wfs"):
+                    for wf in apiResp["basic"]["wfs"]:
+                        wfs += "{}：{}；".format(wf["wf"]["name"], wf["wf"]["value"])
+                    item.title, item.subTitle = wfs, phonetic
+                else:
+                    item.title, item.subTitle = phonetic, None
+
+                item.action = ResultAction(play_sound, False, self.meta_info, self.api, apiResp.get("speakUrl"))
+                yield item
+
+            if apiResp["basic"].get("explains"):
+                for exp in apiResp["basic"]["explains"]:
+                    item=DictResultItem(self.meta_info, exp, text, "translate")
+                    item.menus=[MenuItem(" 加入到生词本",ResultAction(self.add_word,True,text,exp))]
+                    yield item
@@ -3,7 +3,6 @@ import os
 import uuid
 import time
 
-from PyQt5.QtGui import QGuiApplication
 from plugin_api import PluginInfo, ContextApi, AbstractPlugin, get_logger, I18nInterface
 from result_model import ResultItem, ResultAction, MenuItem, CopyAction
 
@@ -23,7 +23,7 @@ def shorten_url(url):
 
 
 class URLPlugin(AbstractPlugin):
-    meta_info = PluginInfo("URL", "在浏览器打开URL", "images/url_icon1.png", ["surl", "*"], False)
+    meta_info = PluginInfo("URL", "在浏览器打开URL", "images/url_icon1.png", ["surl", "*"], False, weight=1)
 
     def __init__(self, api: ContextApi):
         self.pattern = "^https?://.+"
@@ -161,7 +161,11 @@ class AsyncSuggestThread(QThread):
         self.key = key
 
     def run(self):
+        if self.token.cancelled:
+            return
         items = self.suggestion.suggest(self.text)
+        if self.token.cancelled:
+            return
         results = []
         for item in items:
             result_item = WebSearchResultItem(self.plugin_info, self.i18n, self.engine, item)
@@ -177,7 +181,8 @@ class AsyncSuggestThread(QThread):
 
 
 class WebSearchPlugin(AbstractPlugin, SettingInterface, I18nInterface):
-    meta_info = PluginInfo(icon="images/web_search_icon.png", keywords=[], async_result=True)
+    meta_info = PluginInfo(icon="images/web_search_icon.png", keywords=[], async_result=True, cache_ttl=300,
+                           cache_size=256)
 
     def __init__(self, api: ContextApi):
         SettingInterface.__init__(self)
@@ -32,7 +32,7 @@ def search(name):
             sub_title = f'{path}  {item["url"]}'
             if multi_contain(title+" "+sub_title,name):
                 action=wrapper(item["url"])
-                results.append((title,sub_title,action))
+                results.append((title,sub_title,action,title+" "+sub_title))
     with open(storage_path,encoding="utf-8") as fjson:
         folders=json.load(fjson)["roots"]
         for folder in folders.values():
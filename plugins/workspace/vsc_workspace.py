@@ -58,6 +58,6 @@ def search(name):
             
             # print("folder_uri: " + unquote(folder_uri))
 
-            results.append((title,unquote(folder_uri),action))
+            results.append((title,unquote(folder_uri),action,sub_title))
 
     return results
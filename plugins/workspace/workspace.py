@@ -13,6 +13,14 @@ from result_model import ResultItem, ResultAction, MenuItem, CopyAction
 log = get_logger("Workspace")
 
 
+def multi_contain(total,parts):
+    total_low=total.lower()
+    for p in parts:
+        if p.lower() not in total_low:
+            return False
+    return True
+
+
 class IDE(object):
     def __init__(self,plugin_info,name,keyword,script,icon):
 
@@ -30,19 +38,27 @@ class IDE(object):
             self.instance = imp.load_source(self.name, os.path.join(self.plugin_info.path,self.script))
         
         results=[]
-        for title,sub_title,action in self.instance.search(name):
+        for title,sub_title,action,*match in self.instance.search(name):
             item=ResultItem(self.plugin_info,title,sub_title,self.icon,ResultAction(action,True))
+            # the text the script matched against, used to narrow the results
+            item.match_text=match[0] if match else None
             results.append(item)
 
         return results
 
+    def refine(self,results,name):
+        if any(item.match_text is None for item in results):
+            return None
+        parts=re.split(r"\s",name.strip())
+        return [item for item in results if multi_contain(item.match_text,parts)]
+
 
 
 
 
 class WorkspacePlugin(AbstractPlugin, SettingInterface):
     meta_info = PluginInfo("Workspace", "打开工作空间", "images/workspace_icon.png",
-                           [], False)
+                           [], False, refinable=True)
 
     def __init__(self, api: ContextApi):
         SettingInterface.__init__(self)
@@ -55,6 +71,9 @@ class WorkspacePlugin(AbstractPlugin, SettingInterface):
         results=ide.search(text)
         return results
 
+    def refine(self, keyword, text, results):
+        return self.ides[keyword].refine(results,text)
+
     def reload(self):
         SettingInterface.reload(self)
         self.load_ides()
@@ -0,0 +1,56 @@
+import bisect
+import heapq
+import itertools
+
+
+class Ranker(object):
+    """
+    Merges the results of all plugins of a query by rank: the weight of the plugin (PluginInfo.weight) plus the
+    score of the result (ResultItem.score), divided by the best score of its plugin in the query once that exceeds 1,
+    plus how often the user picked it after the same text (see frecency).
+    Equal ranks keep the arrival order, so results without score stay in the order of their plugins.
+    Only the best top_k results are kept, late results are inserted at their rank.
+    """
+
+    def __init__(self, top_k=100, frecency=None):
+        self.top_k = top_k
+        # frecency(item) -> the pick score of the result for the current text
+        self.frecency = frecency
+        self.reset()
+
+    def reset(self):
+        # sort keys of the kept results, the best first
+        self.keys = []
+        # plugin_info -> best score in the query
+        self.best = {}
+        self.counter = itertools.count()
+
+    def keyed(self, items):
+        for item in items:
+            if item.score > self.best.get(item.plugin_info, 1):
+                self.best[item.plugin_info] = item.score
+        return [((-(item.plugin_info.weight + item.score / self.best.get(item.plugin_info, 1) +
+                    (self.frecency(item) if self.frecency else 0)), next(self.counter)), item) for item in items]
+
+    def rank(self, items):
+        # -> the best top_k of the results of a new query, in rank order
+        self.reset()
+        ranked = heapq.nsmallest(self.top_k, self.keyed(items), key=lambda keyed: keyed[0])
+        self.keys = [key for key, _ in ranked]
+        return [item for _, item in ranked]
+
+    def insert(self, items):
+        # -> [(row, item)] to insert one after another, and the count of rows falling off the end afterwards
+        inserts = []
+        for key, item in sorted(self.keyed(items), key=lambda keyed: keyed[0]):
+            row = bisect.bisect(self.keys, key)
+            if row >= self.top_k:
+                break
+            self.keys.insert(row, key)
+            inserts.append((row, item))
+        dropped = max(0, len(self.keys) - self.top_k)
+        del self.keys[self.top_k:]
+        return inserts, dropped
+
+    def remove(self, row):
+        del self.keys[row]
@@ -0,0 +1,57 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache(object):
+    """
+    Results of plugins that declare a cache_ttl, keyed by (keyword, normalized text) per plugin.
+    Every plugin keeps at most meta_info.cache_size entries, the least recently used ones are evicted first.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    @staticmethod
+    def normalize(text):
+        return re.sub(r"\s+", " ", text.strip())
+
+    def get(self, plugin, keyword, text):
+        if not plugin.meta_info.cache_ttl:
+            return None
+        key = (keyword, self.normalize(text))
+        with self.lock:
+            entries = self.entries.get(plugin)
+            if not entries or key not in entries:
+                return None
+            expire, results = entries[key]
+            if expire < time.monotonic():
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            return list(results)
+
+    def put(self, plugin, keyword, text, results):
+        meta_info = plugin.meta_info
+        if not meta_info.cache_ttl:
+            return
+        key = (keyword, self.normalize(text))
+        with self.lock:
+            entries = self.entries.setdefault(plugin, OrderedDict())
+            entries[key] = (time.monotonic() + meta_info.cache_ttl, list(results))
+            entries.move_to_end(key)
+            while len(entries) > meta_info.cache_size:
+                entries.popitem(last=False)
+
+    def invalidate(self, plugin=None):
+        # drop the entries of the plugin, or all of them if it isn't a plugin (e.g. the main setting).
+        # A lazy plugin is cached under its LazyPlugin, the setting reloads with the loaded plugin
+        with self.lock:
+            if not hasattr(plugin, "query"):
+                self.entries.clear()
+                return
+            for cached in [cached for cached in self.entries
+                           if cached is plugin or getattr(cached, "plugin", None) is plugin]:
+                del self.entries[cached]
@@ -1,15 +1,23 @@
 import os
+import threading
 
 from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSize, QRect, QPoint, Qt, pyqtSignal, QRectF
-from PyQt5.QtGui import QPixmap, QColor, QBrush, QFont, QIcon
+from PyQt5.QtGui import QColor, QBrush, QFont, QIcon, QPixmap, QPainter
 from PyQt5.QtSvg import QSvgRenderer
 from PyQt5.QtWidgets import QStyledItemDelegate, QAbstractItemDelegate,QToolTip
 
-from result_model import ResultItem
+from result_model import ResultItem, ResultSource, IconRequest
+from plugin_api import get_logger
+from ranker import Ranker
+from pixmap_cache import pixmap_cache, PixmapCache
+from icon_loader import icon_loader
+from difflib import SequenceMatcher
 
 from gui_size import ItemSize
 import re
 
+log = get_logger("ResultList")
+
 
 class ItemSelection(object):
     def __init__(self):
@@ -28,12 +36,21 @@ class ItemSelection(object):
 
 class ResultListModel(QAbstractListModel):
     sin_out = pyqtSignal()
+    sin_fetched = pyqtSignal(list, list)
 
-    def __init__(self, view):
+    def __init__(self, view, top_k=100, frecency=None, page_size=20):
         super().__init__()
         self.view = view
         self.listItemData = []
         self.select = ItemSelection()
+        self.top_k = top_k
+        self.ranker = Ranker(top_k, frecency)
+        # ResultSources of the query, their next pages are fetched when the list is scrolled to its end
+        self.sources = []
+        self.page_size = page_size
+        self.fetching = False
+        self.sin_fetched.connect(self.add_fetched)
+        icon_loader.sin_loaded.connect(self.icon_loaded)
 
     def create_index(self, inc=0):
         if self.rowCount():
@@ -52,43 +69,162 @@ class ResultListModel(QAbstractListModel):
 
     def addItem(self, itemData: ResultItem):
         if itemData:
-            self.beginInsertRows(QModelIndex(), self.rowCount(), self.rowCount())
-            self.listItemData.append(itemData)
-            self.endInsertRows()
-            self.sin_out.emit()
+            self.addItems([itemData])
+
+    @staticmethod
+    def split_sources(itemDatas):
+        # -> the results and the ResultSources among them
+        sources = [itemData for itemData in itemDatas if isinstance(itemData, ResultSource)]
+        if sources:
+            itemDatas = [itemData for itemData in itemDatas if not isinstance(itemData, ResultSource)]
+        return itemDatas, sources
 
     def addItems(self, itemDatas: list):
-        if itemDatas:
-            if not self.rowCount():
-                self.select.set_selected(0)
-            self.beginInsertRows(QModelIndex(), self.rowCount(), self.rowCount() + len(itemDatas) - 1)
-            self.listItemData += itemDatas
+        # late results are inserted at their rank, the selected result stays selected
+        itemDatas, sources = self.split_sources(itemDatas)
+        self.sources += sources
+        inserts, dropped = self.ranker.insert(itemDatas)
+        if not inserts:
+            return
+        if not self.rowCount():
+            self.select.set_selected(-1)
+        # inserts into adjacent rows are done in one transaction
+        start = 0
+        while start < len(inserts):
+            end = start + 1
+            while end < len(inserts) and inserts[end][0] == inserts[end - 1][0] + 1:
+                end += 1
+            first, last = inserts[start][0], inserts[end - 1][0]
+            self.beginInsertRows(QModelIndex(), first, last)
+            self.listItemData[first:first] = [itemData for _, itemData in inserts[start:end]]
+            if -1 < first <= self.select.row:
+                self.select.row += end - start
             self.endInsertRows()
-            self.sin_out.emit()
+            start = end
+        if not self.select.valid():
+            self.select.set_selected(0)
+        if dropped:
+            self.beginRemoveRows(QModelIndex(), self.rowCount() - dropped, self.rowCount() - 1)
+            del self.listItemData[-dropped:]
+            self.endRemoveRows()
+            if self.select.row >= self.rowCount():
+                self.select.set_selected(self.rowCount() - 1)
+        self.sin_out.emit()
 
     def changeItems(self, itemDatas, instant):
+        itemDatas, self.sources = self.split_sources(itemDatas)
+        self.fetching = False  # a fetch still running is for the superseded results
+        self.ranker.top_k = self.top_k
+        itemDatas = self.ranker.rank(itemDatas)
         change_size = len(itemDatas) != self.rowCount() or self.select.expand
-        self.clear()
-        if itemDatas:
-            self.beginInsertRows(QModelIndex(), self.rowCount(), self.rowCount() + len(itemDatas) - 1)
-            self.listItemData = itemDatas
-            if instant:
-                if self.select.row == -1:
-                    self.select.set_selected(0)
-                elif self.select.row >= self.rowCount():
-                    self.select.set_selected(self.rowCount() - 1)
-                else:
-                    self.select.set_selected(self.select.row)
-            else:
-                self.select.set_selected(0)
-            self.endInsertRows()
-        else:
+        # a result the user moved to, or any result of a refresh, stays selected wherever it's ranked now
+        selected = self.selected_item() if self.select.valid() and (instant or self.select.row) else None
+        self.diff(itemDatas)
+        rows = {item.identity(): row for row, item in enumerate(itemDatas)}
+        if not itemDatas:
             self.select.set_selected(-1)
+        elif selected and selected.identity() in rows:
+            self.select.set_selected(rows[selected.identity()])
+        elif instant:
+            self.select.set_selected(min(max(self.select.row, 0), self.rowCount() - 1))
+        else:
+            self.select.set_selected(0)
         if change_size:
             self.sin_out.emit()
 
+    def canFetchMore(self, parent=QModelIndex()):
+        return not self.fetching and any(not source.done for source in self.sources)
+
+    def fetchMore(self, parent=QModelIndex()):
+        # the next page of every ResultSource is fetched in a worker thread and inserted at its rank
+        if not self.canFetchMore():
+            return
+        self.fetching = True
+        sources = [source for source in self.sources if not source.done]
+        threading.Thread(target=self.fetch, args=(sources,), daemon=True).start()
+
+    def fetch(self, sources):
+        items = []
+        for source in sources:
+            try:
+                items += source.more(self.page_size)
+            except BaseException as e:
+                log.error("获取更多结果失败：{}".format(e))
+                source.done = True
+        self.sin_fetched.emit(sources, items)
+
+    def add_fetched(self, sources, items):
+        if not any(source in self.sources for source in sources):  # the results were changed meanwhile
+            return
+        self.fetching = False
+        # fetched pages extend the list instead of pushing the last rows out
+        self.ranker.top_k = max(self.ranker.top_k, len(self.listItemData) + len(items))
+        self.addItems(items)
+
+    def icon_loaded(self, key):
+        # only the rows waiting for the icon are repainted
+        for row, itemData in enumerate(self.listItemData):
+            if isinstance(itemData.icon, IconRequest) and itemData.icon.key == key:
+                self.dataChanged.emit(self.index(row), self.index(row))
+
+    @staticmethod
+    def identities(itemDatas):
+        # identity and occurrence of every result, results with the same identity are told apart by their order
+        seen = {}
+        keys = []
+        for itemData in itemDatas:
+            identity = itemData.identity()
+            seen[identity] = seen.get(identity, -1) + 1
+            keys.append((identity, seen[identity]))
+        return keys
+
+    def diff(self, itemDatas):
+        # turn the rows into itemDatas with removes, moves and inserts, the unchanged rows are kept by the view.
+        # Results kept in the same order don't move, any other one moves at most twice
+        keys, new_keys = self.identities(self.listItemData), self.identities(itemDatas)
+        new_set = set(new_keys)
+        end = len(keys)
+        while end > 0:
+            start = end
+            while start > 0 and keys[start - 1] not in new_set:
+                start -= 1
+            if start < end:
+                self.beginRemoveRows(QModelIndex(), start, end - 1)
+                del self.listItemData[start:end], keys[start:end]
+                self.endRemoveRows()
+            end = start - 1
+        kept = set(keys)
+        matcher = SequenceMatcher(None, keys, [key for key in new_keys if key in kept], autojunk=False)
+        stable = set(key for a, _, size in matcher.get_matching_blocks() for key in keys[a:a + size])
+
+        def move(source, destination):
+            self.beginMoveRows(QModelIndex(), source, source, QModelIndex(), destination)
+            row = destination if destination < source else destination - 1
+            self.listItemData.insert(row, self.listItemData.pop(source))
+            keys.insert(row, keys.pop(source))
+            self.endMoveRows()
+
+        for row, (key, itemData) in enumerate(zip(new_keys, itemDatas)):
+            if key not in kept:
+                self.beginInsertRows(QModelIndex(), row, row)
+                self.listItemData.insert(row, itemData)
+                keys.insert(row, key)
+                self.endInsertRows()
+                continue
+            while keys[row] != key:
+                if key not in stable:
+                    move(keys.index(key), row)
+                else:  # the row holds a result ranked lower now, it's moved up again when its row comes
+                    move(row, len(keys))
+            old = self.listItemData[row]
+            if old is not itemData:
+                self.listItemData[row] = itemData
+                if old.icon != itemData.icon:
+                    self.dataChanged.emit(self.index(row), self.index(row))
+
     def deleteItem(self, index):
         del self.listItemData[index]
+        self.ranker.remove(index)
         self.sin_out.emit()
 
     def getItem(self, index):
@@ -127,14 +263,53 @@ def rgba2qcolor(rgba:str):
     
 
 
+def to_qcolor(color: str):
+    return QColor(color) if color.startswith("#") else rgba2qcolor(color)
+
+
+class PaintResources(object):
+    """
+    Colors, brushes, fonts and sizes of the rows, compiled from the theme and the ItemSize when one of them changes,
+    so paint only looks them up. It's replaced as a whole, never changed.
+    """
+
+    def __init__(self, theme, i_size: ItemSize):
+        result = theme["result"]
+        self.i_size = i_size
+        self.menu_icon_color = theme["color"]
+        self.color = to_qcolor(result["normal"]["color"])
+        self.highlight_color = to_qcolor(result["highlight"]["color"])
+        self.highlight_brush = QBrush(to_qcolor(result["highlight"]["background"]), Qt.SolidPattern)
+
+        self.font = QFont()
+        self.font.setFamilies(["微软雅黑", "FontAwesome"])
+        self.font.setPixelSize(i_size.font_size)
+        self.font.setWeight(i_size.font_weight)
+        self.sub_font = QFont()
+        self.sub_font.setFamilies(self.font.families())
+        self.sub_font.setPixelSize(i_size.sub_font_size)
+
+        self.icon_size = QSize(i_size.icon_size[0], i_size.icon_size[1])
+        self.height = i_size.height
+
+
 class WidgetDelegate(QAbstractItemDelegate):
 
-    def __init__(self, model: ResultListModel, i_size: ItemSize, theme=DEFAULT_COLOR):
+    def __init__(self, model: ResultListModel, i_size: ItemSize, theme=DEFAULT_COLOR, row_cache=False):
         super(WidgetDelegate, self).__init__()
         self.theme = theme
         self.model = model
         self.i_size = i_size
         self.menu_icon = {}
+        self.resources = None
+        # rendered rows, keyed by what they show: (identity, icon, menus, selection, resources, size, ratio)
+        self.row_cache = PixmapCache(16 * 1024 * 1024) if row_cache else None
+
+    def compile(self):
+        # after the theme or the i_size changed
+        self.resources = PaintResources(self.theme, self.i_size) if self.i_size else None
+        if self.row_cache:
+            self.row_cache.clear()
 
     def get_menu_icon_data(self, color):
         if color in self.menu_icon:
@@ -148,80 +323,92 @@ class WidgetDelegate(QAbstractItemDelegate):
             return render
 
     def paint(self, painter, option, index):
-        theme = self.theme["result"]
-        highlight_background=QColor(theme["highlight"]["background"]) \
-            if theme["highlight"]["background"].startswith("#") \
-            else rgba2qcolor(theme["highlight"]["background"])
-        if index.row() == self.model.select.row and self.model.select.selected_menu == -1:
-            background_brush = QBrush(highlight_background, Qt.SolidPattern)
-            painter.fillRect(QRect(0, option.rect.top(), option.rect.width(), self.i_size.height), background_brush)
-            if len(index.data().menus) and not self.model.select.expand:
-                render = self.get_menu_icon_data(self.theme["color"])
-                left = option.rect.width() - (self.i_size.drop_size[0] + self.i_size.drop_margin[0])
-                top = option.rect.top() + self.i_size.drop_margin[1]
-                render.render(painter, QRectF(left, top, self.i_size.drop_size[0], self.i_size.drop_size[1]))
-
-        font = QFont()
-        font.setFamilies(["微软雅黑", "FontAwesome"])
-        font.setPixelSize(self.i_size.font_size)
-        font.setWeight(self.i_size.font_weight)
-        sub_font = QFont()
-        sub_font.setFamilies(font.families())
-        sub_font.setPixelSize(self.i_size.sub_font_size)
-
-        title = index.data().title
-        sub_title = index.data().subTitle
-        icon_size = QSize(self.i_size.icon_size[0], self.i_size.icon_size[1])
-
-        plugin_path = index.data().plugin_info.path
-        if isinstance(index.data().icon, QIcon):
-            pm = index.data().icon.pixmap(QSize(icon_size.width(), icon_size.height()))
-            icon = QIcon(pm)
-        else:
-            if index.data().root:
-                pm = QPixmap(index.data().icon)
-            else:
-                pm = QPixmap(os.path.join(plugin_path, index.data().icon))
-            pm = pm.scaled(icon_size.width(), icon_size.height(), Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
-            icon = QIcon(pm)
-        icon_rect = QRect(self.i_size.icon_margin[0], option.rect.top() + self.i_size.icon_margin[1], icon_size.width(),
-                          icon_size.height())
-        header_rect = QRect(self.i_size.title_margin[0], option.rect.top() + self.i_size.title_margin[1],
-                            option.rect.width() - self.i_size.height * 2,
-                            self.i_size.title_height)
-        sub_title_rect = QRect(self.i_size.height, header_rect.bottom(), header_rect.width(),
-                               self.i_size.sub_title_height)
-
-        color = theme["normal"]["color"]
-        if index.row() == self.model.select.row and self.model.select.selected_menu == -1:
-            color = theme["highlight"]["color"]
+        if not self.resources:
+            self.compile()
+        if not self.row_cache:
+            self.paint_row(painter, option.rect, index)
+            return
+        # a row whose inputs didn't change since it was painted last is a blit of its pixmap
+        rect, ratio = option.rect, painter.device().devicePixelRatioF()
+        pixmap = self.row_cache.lookup(self.row_key(index, rect.width(), rect.height(), ratio),
+                                       lambda: self.render_row(index, rect.width(), rect.height(), ratio))
+        painter.drawPixmap(rect.topLeft(), pixmap)
+
+    def row_key(self, index, width, height, ratio):
+        item = index.data()
+        select = self.model.select
+        selected = index.row() == select.row
+        icon = self.icon_source(item)
+        icon = icon.cacheKey() if isinstance(icon, QIcon) else icon
+        return (item.identity(), icon, tuple(menu.title for menu in item.menus), selected,
+                selected and select.expand, select.selected_menu if selected else -1, id(self.resources),
+                width, height, ratio)
+
+    def render_row(self, index, width, height, ratio):
+        pixmap = QPixmap(round(width * ratio), round(height * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        self.paint_row(painter, QRect(0, 0, width, height), index)
+        painter.end()
+        return pixmap
+
+    @staticmethod
+    def icon_source(item):
+        # -> the QIcon or the path of the icon to paint, the placeholder of an IconRequest until it's loaded
+        icon = item.icon
+        if isinstance(icon, IconRequest):
+            loaded = icon_loader.get(icon)
+            icon = loaded if loaded is not None else icon.placeholder or item.plugin_info.icon
+        if isinstance(icon, QIcon) or item.root:
+            return icon
+        return os.path.join(item.plugin_info.path, icon)
+
+    def paint_row(self, painter, rect, index):
+        r = self.resources
+        i_size = r.i_size
+        item = index.data()
+        highlighted = index.row() == self.model.select.row and self.model.select.selected_menu == -1
+        if highlighted:
+            painter.fillRect(QRect(0, rect.top(), rect.width(), r.height), r.highlight_brush)
+            if len(item.menus) and not self.model.select.expand:
+                render = self.get_menu_icon_data(r.menu_icon_color)
+                left = rect.width() - (i_size.drop_size[0] + i_size.drop_margin[0])
+                top = rect.top() + i_size.drop_margin[1]
+                render.render(painter, QRectF(left, top, i_size.drop_size[0], i_size.drop_size[1]))
+
+        icon = pixmap_cache.get(self.icon_source(item), r.icon_size.width(), r.icon_size.height(),
+                                painter.device().devicePixelRatioF())
+        header_rect = QRect(i_size.title_margin[0], rect.top() + i_size.title_margin[1],
+                            rect.width() - r.height * 2,
+                            i_size.title_height)
+        sub_title_rect = QRect(r.height, header_rect.bottom(), header_rect.width(),
+                               i_size.sub_title_height)
+
+        color = r.highlight_color if highlighted else r.color
         painter.drawPixmap(
-            QPoint(icon_rect.left(), icon_rect.top()),
-            icon.pixmap(icon_size.width(), icon_size.height()))
-        painter.setFont(font)
-        painter.setPen(QColor(color))
-        painter.drawText(header_rect, Qt.AlignTop, title)
+            QPoint(i_size.icon_margin[0], rect.top() + i_size.icon_margin[1]), icon)
+        painter.setFont(r.font)
+        painter.setPen(color)
+        painter.drawText(header_rect, Qt.AlignTop, item.title)
 
-        painter.setFont(sub_font)
-        painter.setPen(QColor(color))
-        painter.drawText(sub_title_rect, Qt.AlignTop, sub_title)
+        painter.setFont(r.sub_font)
+        painter.drawText(sub_title_rect, Qt.AlignTop, item.subTitle)
 
         if self.model.select.expand and self.model.select.row == index.row():
-            for i in range(len(index.data().menus)):
-                color = theme["normal"]["color"]
-                menu_rect = QRect(self.i_size.height,
-                                  option.rect.top() + self.i_size.height + i * self.i_size.menu_height,
-                                  option.rect.width() - self.i_size.height, self.i_size.menu_height)
+            for i in range(len(item.menus)):
+                color = r.color
+                menu_rect = QRect(r.height,
+                                  rect.top() + r.height + i * i_size.menu_height,
+                                  rect.width() - r.height, i_size.menu_height)
                 if i == self.model.select.selected_menu:
-                    background_brush = QBrush(highlight_background, Qt.SolidPattern)
-                    painter.fillRect(menu_rect, background_brush)
-                    color = theme["highlight"]["color"]
-                painter.setFont(sub_font)
-                painter.setPen(QColor(color))
+                    painter.fillRect(menu_rect, r.highlight_brush)
+                    color = r.highlight_color
+                painter.setPen(color)
                 painter.drawText(
-                    QRect(menu_rect.left() + self.i_size.menu_left_margin, menu_rect.top(), menu_rect.width(),
+                    QRect(menu_rect.left() + i_size.menu_left_margin, menu_rect.top(), menu_rect.width(),
                           menu_rect.height()),
-                    Qt.AlignVCenter, index.data().menus[i].title)
+                    Qt.AlignVCenter, item.menus[i].title)
         # painter.restore()
 
     def sizeHint(self, option, index: QModelIndex) -> QSize: